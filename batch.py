@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Grade a directory of saved bridge designs without a display.
+
+Every design is simulated headless (see PhysicsGame.run_headless), at
+the canvas size it was saved with, in a pool of worker processes, each
+with its own Box2D world. One result per design is written as JSON
+lines, or as CSV if the output file name ends in .csv.
+
+Usage: python3 batch.py [-j JOBS] [-o RESULTS] [-t MAX_TIME] DIRECTORY
+"""
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+FIELDS = ['design', 'passed', 'fell', 'time', 'peak_stress',
+          'joints_broken', 'cost', 'error']
+
+
+def evaluate(job):
+    path, max_time = job
+    result = dict.fromkeys(FIELDS)
+    result['design'] = os.path.basename(path)
+
+    # the game prints its progress, keep standard output for results
+    with contextlib.redirect_stdout(sys.stderr):
+        # imported here, so the pool is forked before pygame and Box2D
+        # are loaded
+        from physics import PhysicsGame
+
+        try:
+            game = PhysicsGame()
+            result.update(game.run_headless(path, max_time=max_time))
+        except Exception as e:
+            result['error'] = '%s: %s' % (e.__class__.__name__, e)
+    result.pop('steps', None)
+    return result
+
+
+def find_designs(directory):
+    designs = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            designs.append(path)
+    return designs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulate saved Bridge designs in parallel.')
+    parser.add_argument('directory',
+                        help='directory with journal saves')
+    parser.add_argument('-o', '--output',
+                        help='results file (.csv or JSON lines), '
+                             'default: standard output')
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('-t', '--max-time', type=float, default=60.0,
+                        help='simulated seconds before giving up')
+    args = parser.parse_args()
+
+    # the workers inherit it before they import pygame
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+    jobs = [(path, args.max_time) for path in find_designs(args.directory)]
+
+    if args.output:
+        out = open(args.output, 'w', newline='')
+    else:
+        out = sys.stdout
+
+    writer = None
+    if args.output and args.output.endswith('.csv'):
+        writer = csv.DictWriter(out, FIELDS)
+        writer.writeheader()
+
+    pool = multiprocessing.Pool(args.jobs)
+    try:
+        for result in pool.imap(evaluate, jobs):
+            if writer is not None:
+                writer.writerow(result)
+            else:
+                out.write(json.dumps(result) + '\n')
+            out.flush()
+    finally:
+        pool.close()
+        pool.join()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the Elements layer and the Bridge game logic.
+
+Run them with `python3 -m benchmarks`, see benchmarks/__main__.py.
+"""
@@ -0,0 +1,92 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Usage: python3 -m benchmarks [-s SIZES] [-r REPEAT] [-o RESULTS]
+                             [-b BASELINE] [-t TOLERANCE]
+
+Times Elements.update, Elements.draw, Bridge.for_each_frame,
+get_bodies_at_pos (cold and cached) and json_save/json_load on
+synthetic trusses and writes the results (milliseconds, best of
+REPEAT, and the size of the save in bytes) as JSON. With a BASELINE
+from an earlier run, operations that got slower than the tolerance
+are listed and the exit status is 1.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+
+# before pygame is imported by the suite
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import Box2D as box2d
+
+from benchmarks import suite
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m benchmarks',
+        description='Benchmark the Elements layer of Bridge.')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=suite.SIZES,
+                        help='number of girders of the trusses')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output',
+                        help='write results to this file, '
+                             'default: standard output')
+    parser.add_argument('-b', '--baseline',
+                        help='results of an earlier run to compare with')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {'python': platform.python_version(),
+                 'box2d': getattr(box2d, '__version__', None),
+                 'machine': platform.machine(),
+                 'repeat': args.repeat},
+        'results': {}}
+    for size in args.sizes:
+        print('* %d girders' % size, file=sys.stderr)
+        # the game prints its progress, keep standard output for results
+        with contextlib.redirect_stdout(sys.stderr):
+            results['results'][str(size)] = suite.run(size, args.repeat)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = suite.compare(results, baseline, args.tolerance)
+        for size, name, before, after, ratio in slower:
+            print('%s girders: %s %.3f -> %.3f ms (x%.2f)'
+                  % (size, name, before, after, ratio), file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import random
+import tempfile
+import time
+
+import Box2D as box2d
+import pygame
+
+from lib.myelements import elements
+from physics import PhysicsGame
+
+SIZES = [10, 100, 1000, 5000]
+SCREEN = (1200, 900)
+
+# girders per row, and their size in pixels (like GirderTool)
+ROW = 50
+LENGTH = 100
+THICKNESS = 30
+
+
+def build_bridge(members):
+    """ Build a headless game with a synthetic truss of members girders
+
+        The girders are laid out in rows of ROW, every row is a chain
+        of revolute joints (like BridgeJointTool makes) fixed to the
+        ground at both ends.
+
+        Return: PhysicsGame with world and bridge set up
+    """
+    random.seed(0)
+    game = PhysicsGame()
+    game.headless = True
+    game.screen = pygame.Surface(SCREEN)
+    game.world = elements.Elements(SCREEN)
+    game.world.renderer.set_surface(game.screen)
+    game.world.set_background((80, 160, 240))
+    game.world.run_physics = False
+    game.create_bridge()
+
+    world = game.world
+    step = float(SCREEN[0]) / ROW
+    scale = step / LENGTH
+    bodies = []
+    for i in range(members):
+        row, column = divmod(i, ROW)
+        x = (column + 0.5) * step
+        y = 100 + row * (SCREEN[1] - 200.0) / max(1, members // ROW)
+        body = world.add.rect((x, y), step / 2, THICKNESS * scale / 2,
+                              dynamic=True, density=1.0, restitution=0.16,
+                              friction=0.5)
+        if column == 0:
+            previous = world.world.groundBody
+        else:
+            previous = bodies[-1]
+        join(world, previous, body, (column * step, y))
+        if column == ROW - 1 or i == members - 1:
+            join(world, body, world.world.groundBody,
+                 ((column + 1) * step, y))
+        bodies.append(body)
+
+    game.bridge.create_train()
+    world.run_physics = True
+    return game, bodies
+
+
+def join(world, body1, body2, pos):
+    jointDef = box2d.b2RevoluteJointDef()
+    jointDef.Initialize(body1, body2, world.add.to_b2vec(pos))
+    joint = world.world.CreateJoint(jointDef)
+    world.world_changed()
+    return joint
+
+
+def timeit(function, repeat):
+    """ Return: best time of repeat calls in ms """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        took = (time.perf_counter() - start) * 1000.0
+        if best is None or took < best:
+            best = took
+    return best
+
+
+def run(members, repeat=5):
+    """ Time the Elements operations on a truss of members girders
+
+        Return: dict of operation name -> best time in ms
+    """
+    game, bodies = build_bridge(members)
+    world = game.world
+    results = {}
+
+    results['update'] = timeit(world.update, repeat)
+    results['draw'] = timeit(world.draw, repeat)
+    results['for_each_frame'] = timeit(
+        lambda: game.bridge.for_each_frame(draw=True), repeat)
+
+    points = [world.to_screen((body.position.x * world.ppm,
+                               body.position.y * world.ppm))
+              for body in bodies[:100]]
+
+    def query(cold):
+        if cold:
+            world.world_changed()  # empty the hit test cache
+        return [world.get_bodies_at_pos(p) for p in points]
+
+    results['get_bodies_at_pos'] = timeit(
+        lambda: query(True), repeat) / len(points)
+    # the same points again in the same frame, answered from the cache
+    query(True)
+    results['get_bodies_at_pos_cached'] = timeit(
+        lambda: query(False), repeat) / len(points)
+
+    handle, path = tempfile.mkstemp(prefix='bridge-bench-')
+    os.close(handle)
+    try:
+        additional = {'trackinfo': {}, 'full_pos_list': [],
+                      'tracked_bodies': 0, 'cost': 0, 'capacity': 1}
+        results['json_save'] = timeit(
+            lambda: world.json_save(path, dict(additional),
+                                    serialize=True), repeat)
+        results['json_load'] = timeit(
+            lambda: world.json_load(path, serialized=True), repeat)
+        results['save_size'] = os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    """ Compare results with a baseline
+
+        Return: list of (size, operation, baseline, result, ratio) for
+                every operation that got more than tolerance slower
+    """
+    slower = []
+    for size, operations in results['results'].items():
+        for name, value in operations.items():
+            try:
+                before = baseline['results'][size][name]
+            except KeyError:
+                continue
+            if before and value / before > 1.0 + tolerance:
+                slower.append((size, name, before, value, value / before))
+    return slower
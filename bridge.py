@@ -15,11 +15,32 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import itertools
+
+import numpy
 import pygame
 from gi.repository import Gdk
 
-SCALE_X = Gdk.Screen.width() * 1.5 / 1920
-SCALE_Y = Gdk.Screen.height() * 1.2 / 1080
+from runhistory import RunHistory
+from snapping import EndpointIndex
+
+# Without a display (headless runs) assume the XO laptop screen
+_screen = Gdk.Screen.get_default()
+if _screen is not None:
+    SCREEN_SIZE = (_screen.get_width(), _screen.get_height())
+else:
+    SCREEN_SIZE = (1200, 900)
+
+# The game draws on the activity canvas, the screen without the toolbar
+# (see activity.py). Designs saved without their size were built on it.
+try:
+    from sugar3.graphics.style import GRID_CELL_SIZE
+except ImportError:
+    GRID_CELL_SIZE = 75
+CANVAS_SIZE = (SCREEN_SIZE[0], SCREEN_SIZE[1] - 2 * GRID_CELL_SIZE)
+
+SCALE_X = SCREEN_SIZE[0] * 1.5 / 1920
+SCALE_Y = SCREEN_SIZE[1] * 1.2 / 1080
 
 
 class Bridge:
@@ -29,22 +50,45 @@ class Bridge:
         self.world = game.world
         self.cost = 0
         self.stress = 0
+        self.peak_stress = 0
+        self.joints_broken = 0
+        self.reset_joint_stress()
+        self.stress_history = StressHistory()
         self.capacity = 1
         self.first_train = None
         self.train_off_screen = False
         self.train_was_created = False
         self.train_exit = False
         self.level_completed = False
-        self.sounds = {"wooo": loadSound("sounds/wooo.wav"),
-                       "death": loadSound("sounds/death.wav"),
-                       "startup": loadSound("sounds/startup.wav")}
+        # the world just before the first train, restart() rewinds to it
+        self.pre_train = None
+        # keyframes of the current run, for seek(); with the capacity
+        # and broken joint count it started with
+        self.history = None
+        self.history_base = None
+        # girder ends, for BridgeJointTool to snap to
+        self.endpoints = EndpointIndex(self.world)
+        self.sounds = {}
+        for name in ("wooo", "death", "startup"):
+            self.sounds[name] = loadSound("sounds/%s.wav" % name,
+                                          enabled=not game.headless)
 
     def restart(self):
         self.world.run_physics = False
+        if self.pre_train is not None:
+            snapshot, self.cost, self.capacity = self.pre_train
+            self.world.restore(snapshot)
+            self.pre_train = None
+            self.first_train = None
+            self.reset_joint_stress()
+        self.history = None
         self.train_off_screen = False
         self.train_exit = False
         self.level_completed = False
         self.train_was_created = False
+        self.peak_stress = 0
+        self.joints_broken = 0
+        self.stress_history.clear()
 
     def create_world(self):
         self.world.set_color((100, 150, 50))
@@ -67,51 +111,110 @@ class Bridge:
         self.cost = self.cost + value
         print("cost now", value)
 
+    def edited(self):
+        # the player changed the bridge: the recorded run no longer
+        # matches it, and seeking would restore the old bridge
+        self.history = None
+        self.history_base = None
+        # the joints of the last step may be gone
+        self.reset_joint_stress()
+
     def joint_added(self, joint):
         print("joint added!")
+        self.edited()
         self.add_cost(100)
         self.capacity += 500
 
     def joint_deleted(self, joint):
         print("joint deleting!")
+        self.edited()
+        # b2Body.joints hands out joint edges
+        self.stress_history.retire([getattr(joint, 'joint', joint)])
         if self.cost > 0:
             self.add_cost(-100)
         self.capacity -= 500
 
     def box_added(self):
+        self.edited()
         self.add_cost(10)
 
     def circle_added(self):
+        self.edited()
         self.add_cost(10)
 
     def object_deleted(self):
+        self.edited()
         if self.cost > 0:
             self.add_cost(-10)
 
-    def for_each_frame(self):
-        self.stress = 0
-        joint = self.world.world.joints
-        for j in joint:
+    def objects_added(self, bodies, joints):
+        """ The bookkeeping of box_added and joint_added for many
+            bodies and joints, created at once, with one cost update
+        """
+        print("adding %d objects and %d joints!" % (bodies, len(joints)))
+        self.edited()
+        self.add_cost(10 * bodies + 100 * len(joints))
+        self.capacity += 500 * len(joints)
+
+    def objects_deleted(self, bodies, joints):
+        """ The bookkeeping of joint_deleted and object_deleted for many
+            bodies and their joints, destroyed at once, with one cost
+            update
+        """
+        print("deleting %d objects and %d joints!" % (bodies, len(joints)))
+        self.edited()
+        self.stress_history.retire(joints)
+        cost = self.cost
+        for i in range(len(joints)):
+            if cost > 0:
+                cost -= 100
+        for i in range(bodies):
+            if cost > 0:
+                cost -= 10
+        self.capacity -= 500 * len(joints)
+        self.add_cost(cost - self.cost)
+
+    def for_each_frame(self, draw=True):
+        # motor joints (the train wheels) and joints without a motor
+        # (distance joints) do not count towards the stress
+        joints = []
+        for j in self.world.world.joints:
             try:
                 if not j.motorEnabled:
-                    force = j.GetReactionForce(30).length
-                    self.stress += force
-
-                    if force > 500:
-                        print("destroy joint!")
-                        self.world.world.DestroyJoint(j)
-                        self.capacity -= 500
-                    else:
-                        vec = j.anchorA
-                        coord = int(self.world.meter_to_screen(vec.x)), \
-                            int(self.screen.get_height()
-                                - self.world.meter_to_screen(vec.y))
-                        pygame.draw.circle(self.screen,
-                                           (int(force / 2), 255
-                                            - int(force / 2), 0),
-                                           coord, 6)
+                    joints.append(j)
             except AttributeError:
                 pass
+
+        forces = numpy.fromiter((j.GetReactionForce(30).length
+                                 for j in joints), float, len(joints))
+        self.stress = float(forces.sum())
+        self.peak_stress = max(self.peak_stress, self.stress)
+        self.stress_history.record(joints, forces)
+
+        broken = forces > 500
+        count = int(numpy.count_nonzero(broken))
+        if count:
+            print("destroy %d joints!" % count)
+            destroyed = list(itertools.compress(joints, broken))
+            self.stress_history.retire(destroyed, broken=True)
+            # joints made outside Elements.create_joint have no uid
+            broken_uids = []
+            for j in destroyed:
+                if isinstance(j.userData, dict) and \
+                        j.userData.get('uid') is not None:
+                    broken_uids.append(j.userData['uid'])
+            for j in destroyed:
+                self.world.destroy_joint(j)
+            self.capacity -= 500 * count
+            self.joints_broken += count
+            joints = list(itertools.compress(joints, ~broken))
+            forces = forces[~broken]
+
+        self.stressed_joints = joints
+        self.joint_forces = forces
+        self.stress_revision = self.world.revision
+        if self.history is not None:
+            self.history.record_step(broken_uids if count else ())
         pos = self.first_train.position
         if pos.x < 0.0:
             self.train_exit = True
@@ -124,6 +227,51 @@ class Bridge:
                 print("TRAIN FELL OFF!", pos.x)
                 self.train_off_screen = True
 
+        if draw:
+            self.draw_joints()
+
+    def draw_joints(self):
+        # colour the joints from green to red by the stress of the last step
+        if self.world.revision != self.stress_revision:
+            # bodies (and their joints) were destroyed since, e.g. in a
+            # frame without a physics step
+            self.reset_joint_stress()
+        if not self.stressed_joints:
+            return
+        anchors = numpy.array([self.world.interpolate_point(j.bodyB,
+                                                            j.anchorA)
+                               for j in self.stressed_joints])
+        coords = numpy.empty(anchors.shape, int)
+        coords[:, 0] = self.world.meter_to_screen(anchors[:, 0])
+        coords[:, 1] = self.screen.get_height() \
+            - self.world.meter_to_screen(anchors[:, 1])
+        red = (self.joint_forces / 2).astype(int)
+        colors = numpy.column_stack((red, 255 - red, numpy.zeros_like(red)))
+        for coord, color in zip(coords.tolist(), colors.tolist()):
+            pygame.draw.circle(self.screen, color, coord, 6)
+
+    def reset_joint_stress(self):
+        self.stressed_joints = []
+        self.joint_forces = numpy.zeros(0)
+        self.stress_revision = self.world.revision
+
+    def joint_stress(self, joint, percentiles=(50, 95)):
+        """ Stress statistics of a joint that is still in the world,
+            see StressHistory.stats, or None if it was never sampled
+        """
+        row = self.stress_history.rows.get(joint)
+        if row is None:
+            return None
+        return self.stress_history.stats(row, percentiles)
+
+    def weakest_joints(self, count=1, percentiles=(50, 95)):
+        """ The count joints with the highest peak stress of this run,
+            including the ones that broke, see StressHistory.stats
+        """
+        history = self.stress_history
+        rows = numpy.argsort(-history.peak[:history.size])[:count]
+        return [history.stats(row, percentiles) for row in rows]
+
     def create_train(self, worldpoint=(int(1600 * SCALE_X),
                                        int(490 * SCALE_Y)),
                      train=(int(100 * SCALE_X), int(50 * SCALE_Y)),
@@ -133,6 +281,9 @@ class Bridge:
         if not force and self.train_was_created:
             return
         self.sounds['startup'].play()
+        if not self.train_was_created:
+            self.pre_train = (self.world.snapshot(), self.cost,
+                              self.capacity)
         self.train_was_created = True
         points = []
         self.train_off_screen = False
@@ -183,11 +334,135 @@ class Bridge:
                 self.world.add.distanceJoint(
                     btrain[0], ftrain[0], backlink, frontlink)
 
+        self.history = RunHistory(self.world)
+        self.history_base = (self.cost, self.capacity, self.joints_broken)
+
+    def seek(self, step):
+        """ Show the paused run at a physics step, by restoring the
+            keyframe before it and simulating forward (see RunHistory)
+
+            Return: -
+        """
+        if self.history is None or self.world.run_physics:
+            return
+        before = {}
+        for joint in self.world.world.joints:
+            if isinstance(joint.userData, dict) and 'uid' in joint.userData:
+                before[joint.userData['uid']] = joint
+
+        step = self.history.seek(step, self.game.box2d_fps)
+
+        # the joints the seek destroyed broke at some step of the run
+        for joint in self.world.world.joints:
+            if isinstance(joint.userData, dict):
+                before.pop(joint.userData.get('uid'), None)
+        self.stress_history.retire(list(before.values()), broken=True)
+
+        self.cost, capacity, joints_broken = self.history_base
+        count = self.history.breaks_until(step)
+        self.capacity = capacity - 500 * count
+        self.joints_broken = joints_broken + count
+        self.reset_joint_stress()
+
+        pos = self.first_train.position
+        self.train_exit = pos.x < 0.0
+        self.train_off_screen = pos.y < 0.0 and not self.train_exit
+
+    def seek_by(self, seconds):
+        """ Move the paused run seconds forward (or back, if negative) """
+        if self.history is not None:
+            self.seek(self.history.step
+                      + int(round(seconds * self.game.box2d_fps)))
+
+
+class StressHistory:
+    """ Ring buffers with the last samples reaction forces of every joint
+
+        The buffers are rows of one array, so the memory used depends
+        on the number of joints, not on how long the run is. Peak and
+        mean are kept over the whole run, percentiles over the buffer.
+    """
+
+    def __init__(self, samples=256):
+        self.samples = samples
+        self.clear()
+
+    def clear(self):
+        self.rows = {}  # live joint -> row
+        self.size = 0
+        self.anchors = []
+        self.buffer = numpy.zeros((0, self.samples), numpy.float32)
+        self.count = numpy.zeros(0, int)
+        self.peak = numpy.zeros(0)
+        self.total = numpy.zeros(0)
+        self.broken = numpy.zeros(0, bool)
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self.count))
+        grow = capacity - len(self.count)
+        self.buffer = numpy.vstack(
+            (self.buffer, numpy.zeros((grow, self.samples), numpy.float32)))
+        self.count = numpy.concatenate((self.count, numpy.zeros(grow, int)))
+        self.peak = numpy.concatenate((self.peak, numpy.zeros(grow)))
+        self.total = numpy.concatenate((self.total, numpy.zeros(grow)))
+        self.broken = numpy.concatenate((self.broken,
+                                         numpy.zeros(grow, bool)))
+
+    def _row(self, joint):
+        row = self.rows.get(joint)
+        if row is None:
+            if self.size == len(self.count):
+                self._grow()
+            row = self.rows[joint] = self.size
+            self.anchors.append(joint.anchorA.tuple)
+            self.size += 1
+        return row
+
+    def record(self, joints, forces):
+        """ Add one sample for each joint, forces is an array """
+        if not joints:
+            return
+        rows = numpy.fromiter((self._row(j) for j in joints), int,
+                              len(joints))
+        self.buffer[rows, self.count[rows] % self.samples] = forces
+        self.count[rows] += 1
+        self.peak[rows] = numpy.maximum(self.peak[rows], forces)
+        self.total[rows] += forces
+
+    def retire(self, joints, broken=False):
+        """ Forget joints that are about to be destroyed, their
+            statistics are kept
+        """
+        for joint in joints:
+            row = self.rows.pop(joint, None)
+            if row is not None:
+                self.broken[row] = broken
+
+    def stats(self, row, percentiles=(50, 95)):
+        """ Return: dict with the anchor (in meters) of the joint when it
+            was first sampled, the number of samples, the peak and mean
+            force, whether it broke and the requested percentiles
+        """
+        count = int(self.count[row])
+        window = self.buffer[row, :min(count, self.samples)]
+        stats = {'anchor': self.anchors[row],
+                 'samples': count,
+                 'peak': float(self.peak[row]),
+                 'mean': float(self.total[row] / count) if count else 0.0,
+                 'broken': bool(self.broken[row])}
+        for p in percentiles:
+            if count:
+                stats['p%d' % p] = float(numpy.percentile(window, p))
+            else:
+                stats['p%d' % p] = 0.0
+        return stats
+
+
 # function for loading sounds (mostly borrowed from
 # Pete Shinners pygame tutorial)
 
 
-def loadSound(name):
+def loadSound(name, enabled=True):
     # if the mixer didn't load, then create an empty class
     # that has an empty play method. this way the program
     # will run if the mixer isn't present (sans sound)
@@ -197,7 +472,7 @@ def loadSound(name):
 
         def set_volume(self):
             pass
-    if not pygame.mixer:
+    if not enabled or not pygame.mixer:
         return NoneSound()
     try:
         sound = pygame.mixer.Sound(name)
@@ -0,0 +1,82 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gettext import gettext as _
+
+
+class Hud:
+    """ The text lines in the top left corner of the game
+
+        Rendering text is slow, so every line keeps its rendered surface
+        and is only rendered again when its text or value changes.
+    """
+
+    def __init__(self, font, color=(0, 0, 0), left=12, top=12, spacing=41):
+        self.font = font
+        self.color = color
+        self.left = left
+        self.top = top
+        self.spacing = spacing
+        self.lines = {}  # line number -> ((text, value), surface)
+
+        # translate once, not every frame
+        self.cost = _("Total Cost: %d")
+        self.stress = _("Stress: %d%%")
+        self.fell_off = _("Train fell off the screen, press R to try again!")
+        self.completed = _("Level completed, well done!!")
+        self.another_train = _("Press T to send another train.")
+        self.start = _("Press the Spacebar to start/pause.")
+        self.replay = _("Run at %.1f of %.1f s, use the arrow keys")
+
+    def set_line(self, line, text, value=None):
+        key = (text, value)
+        cached = self.lines.get(line)
+        if cached is not None and cached[0] == key:
+            return
+        if value is not None:
+            text = text % value
+        self.lines[line] = (key, self.font.render(text, True, self.color))
+
+    def update(self, bridge):
+        self.set_line(0, self.cost, bridge.cost)
+        self.set_line(1, self.stress,
+                      int(bridge.stress * 100 / bridge.capacity))
+
+        if bridge.train_off_screen:
+            self.set_line(2, self.fell_off)
+        elif bridge.level_completed:
+            if bridge.train_exit:
+                self.set_line(2, self.another_train)
+            else:
+                self.set_line(2, self.completed)
+        else:
+            self.set_line(2, self.start)
+
+        history = bridge.history
+        if history is not None and history.end and \
+                not bridge.world.run_physics:
+            fps = float(bridge.game.box2d_fps)
+            self.set_line(3, self.replay,
+                          (history.step / fps, history.end / fps))
+        else:
+            self.lines.pop(3, None)
+
+    def draw(self, screen):
+        for line, (key, text) in self.lines.items():
+            textpos = text.get_rect(left=self.left,
+                                    top=self.top + line * self.spacing)
+            screen.blit(text, textpos)
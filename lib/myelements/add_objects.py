@@ -132,12 +132,15 @@ class Add:
         # Create the Body
         if not dynamic:
             density = 0
+            self.parent.static_changed()
         else:
             bodyDef.type = box2d.b2_dynamicBody
 
         body = self.parent.world.CreateBody(bodyDef)
 
         self.parent.element_count += 1
+        self.parent.world_changed()
+        self.parent.body_created(body)
 
         # Add a shape to the Body
         circleShape = box2d.b2CircleShape()
@@ -195,6 +198,42 @@ class Add:
         return self._rect((x, y), width, height, angle,
                           dynamic, density, restitution, friction)
 
+    def rects(
+            self,
+            rects,
+            dynamic=True,
+            density=1.0,
+            restitution=0.16,
+            friction=0.5,
+            screenCoord=True):
+        """ Add many rectangles at once, as one change of the world
+
+            Parameters:
+              rects ..... list of (pos, width, height, angle), as for rect()
+              other ... see [physics parameters]
+
+            Return: list of box2d.b2Body
+        """
+        bodies = []
+        for pos, width, height, angle in rects:
+            if screenCoord:
+                x, y = self.parent.to_world(pos)
+            else:
+                x, y = pos
+
+            if self.parent.input_unit == INPUT_PIXELS:
+                x /= self.parent.ppm
+                y /= self.parent.ppm
+                width /= self.parent.ppm
+                height /= self.parent.ppm
+
+            bodies.append(self._rect((x, y), width, height,
+                                     (angle * pi) / 180, dynamic, density,
+                                     restitution, friction, changed=False))
+
+        self.parent.world_changed()
+        return bodies
+
     def wall(
             self,
             pos1,
@@ -252,10 +291,12 @@ class Add:
             dynamic=True,
             density=1.0,
             restitution=0.16,
-            friction=0.5):
+            friction=0.5,
+            changed=True):
         # Add a rect without correcting any settings
         # meaning, pos and vertices are in meters
         # angle is now in radians ((degrees * pi) / 180))
+        # changed=False leaves world_changed() to the caller
         x, y = pos
         bodyDef = box2d.b2BodyDef()
         bodyDef.position = (x, y)
@@ -266,12 +307,16 @@ class Add:
         # Create the Body
         if not dynamic:
             density = 0
+            self.parent.static_changed()
         else:
             bodyDef.type = box2d.b2_dynamicBody
 
         body = self.parent.world.CreateBody(bodyDef)
 
         self.parent.element_count += 1
+        if changed:
+            self.parent.world_changed()
+        self.parent.body_created(body)
 
         # Add a shape to the Body
         boxDef = box2d.b2FixtureDef()
@@ -348,12 +393,15 @@ class Add:
         # Create the Body
         if not dynamic:
             density = 0
+            self.parent.static_changed()
         else:
             bodyDef.type = box2d.b2_dynamicBody
 
         body = self.parent.world.CreateBody(bodyDef)
 
         self.parent.element_count += 1
+        self.parent.world_changed()
+        self.parent.body_created(body)
 
         # Add a shape to the Body
         polyDef = box2d.b2PolygonShape()
@@ -409,12 +457,15 @@ class Add:
         # Create the Body
         if not dynamic:
             density = 0
+            self.parent.static_changed()
         else:
             bodyDef.type = box2d.b2_dynamicBody
 
         body = self.parent.world.CreateBody(bodyDef)
 
         self.parent.element_count += 1
+        self.parent.world_changed()
+        self.parent.body_created(body)
 
         # Create the reusable Box2D polygon and circle definitions
         polyDef = box2d.b2PolygonShape()
@@ -575,7 +626,7 @@ class Add:
         jointDef = box2d.b2DistanceJointDef()
         jointDef.Initialize(b1, b2, p1, p2)
         jointDef.collideConnected = True
-        self.parent.world.CreateJoint(jointDef)
+        self.parent.create_joint(jointDef)
 
     def joint(self, *args):
         print("* Add Joint:", args)
@@ -591,7 +642,7 @@ class Add:
             jointDef.Initialize(b1, b2, p1, p2)
             jointDef.collideConnected = flag
 
-            self.parent.world.CreateJoint(jointDef)
+            self.parent.create_joint(jointDef)
 
         elif len(args) == 4:
             # Distance Joint
@@ -604,7 +655,7 @@ class Add:
             jointDef.Initialize(b1, b2, p1, p2)
             jointDef.collideConnected = True
 
-            self.parent.world.CreateJoint(jointDef)
+            self.parent.create_joint(jointDef)
 
         elif len(args) == 3:
             # Revolute Joint between two bodies (unimplemented)
@@ -618,7 +669,7 @@ class Add:
 
             jointDef = box2d.b2RevoluteJointDef()
             jointDef.Initialize(b1, b2, p1)
-            self.parent.world.CreateJoint(jointDef)
+            self.parent.create_joint(jointDef)
 
         elif len(args) == 1:
             # Revolute Joint to the Background, body center
@@ -629,7 +680,7 @@ class Add:
             jointDef = box2d.b2RevoluteJointDef()
             jointDef.Initialize(b1, b2, p1)
 
-            self.parent.world.CreateJoint(jointDef)
+            self.parent.create_joint(jointDef)
 
     def motor(self, body, pt, torque=900, speed=-10):
         # Revolute joint to the background with motor torque applied
@@ -642,7 +693,7 @@ class Add:
         jointDef.motorSpeed = speed
         jointDef.enableMotor = True
 
-        self.parent.world.CreateJoint(jointDef)
+        self.parent.create_joint(jointDef)
 
     def jointMotor(self, b1, b2, p1, torque=900, speed=-10):
         p1 = self.to_b2vec(p1)
@@ -651,7 +702,7 @@ class Add:
         jointDef.maxMotorTorque = torque
         jointDef.motorSpeed = speed
         jointDef.enableMotor = True
-        self.parent.world.CreateJoint(jointDef)
+        self.parent.create_joint(jointDef)
 
     def mouseJoint(self, body, pos, jointForce=100.0):
         pos = self.parent.to_world(pos)
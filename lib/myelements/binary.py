@@ -0,0 +1,341 @@
+"""
+This file is part of the 'Elements' Project
+Elements is a 2D Physics API for Python (supporting Box2D2)
+
+Copyright (C) 2008, The Elements Team, <elements@linuxuser.at>
+
+Home:  http://elements.linuxuser.at
+IRC:   #elements on irc.freenode.org
+
+Code:  http://www.assembla.com/wiki/show/elements
+       svn co http://svn2.assembla.com/svn/elements
+
+License:  GPLv3 | See LICENSE for the full text
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+import struct
+import sys
+from array import array
+
+# A binary world file is
+#
+#   header      HEADER
+#   bodies      BODY, followed by SHAPE (+ float32 vertices) per fixture
+#               and, if BODY_USERDATA is set, uint32 length + JSON of
+#               the userData that is more than a color
+#   joints      JOINT, followed by uint32 length + JSON userData if set
+#   metadata    uint32 length + JSON of additional_vars
+#   blocks      uint32 count + count float32, for every array('f') found
+#               in additional_vars
+#
+# All numbers are little endian. The counts in the header are filled in
+# last, once they are known, so the records can be streamed to the file.
+# Streams that can not seek back (compressed ones) set HEADER_TRAILER
+# and put the counts in a TRAILER at the very end instead.
+
+MAGIC = b'ELBW'
+VERSION = 1
+
+# magic, version, flags, bodies, joints, blocks
+HEADER = struct.Struct('<4sHHIII')
+# flags, r, g, b, x, y, angle, angularVelocity, vx, vy, shapes
+BODY = struct.Struct('<BBBBffffffH')
+# type, density, restitution, friction, radius, x, y, vertices
+SHAPE = struct.Struct('<BffffffH')
+# type, collideConnected, enableMotor, has userData, body1, body2,
+# x1, y1, x2, y2, motorSpeed, maxMotorTorque
+JOINT = struct.Struct('<BBBBIIffffff')
+COUNT = struct.Struct('<I')
+TRAILER = struct.Struct('<III')  # bodies, joints, blocks
+
+HEADER_TRAILER = 1
+
+BODY_DYNAMIC = 1
+BODY_COLOR = 2
+BODY_USERDATA = 4
+
+SHAPE_TYPES = ['circle', 'polygon']
+JOINT_TYPES = ['revolute', 'distance']
+
+
+def is_binary(head):
+    """ Return: True if head (the first bytes of a file) is a binary
+        world
+    """
+    return head[:len(MAGIC)] == MAGIC
+
+
+def _write_floats(f, values):
+    # float arrays are written straight from their buffer, no copy
+    if not isinstance(values, array) or values.typecode != 'f' or \
+            sys.byteorder == 'big':
+        values = array('f', values)
+        if sys.byteorder == 'big':
+            values.byteswap()
+    f.write(values)
+
+
+def _unfloats(data):
+    values = array('f', data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _write_json(f, value):
+    data = json.dumps(value).encode('utf-8')
+    f.write(COUNT.pack(len(data)))
+    f.write(data)
+
+
+def _read_json(data, offset):
+    length, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    value = json.loads(data[offset:offset + length].decode('utf-8'))
+    return value, offset + length
+
+
+def _split_color(userdata):
+    # Return: (color or None, the rest of userdata or None)
+    extra = dict(userdata or {})
+    extra.pop('saveid', None)
+    clr = extra.pop('color', None)
+    if clr is not None:
+        try:
+            clr = tuple(int(c) for c in clr)
+        except (TypeError, ValueError):
+            clr = None
+        if clr is None or len(clr) != 3 or \
+                not all(0 <= c <= 255 for c in clr):
+            extra['color'] = userdata['color']
+            clr = None
+    return clr, extra or None
+
+
+def _extract_blocks(value, blocks):
+    # Replace every array('f') in value by {'__block__': index}
+    if isinstance(value, array) and value.typecode == 'f':
+        blocks.append(value)
+        return {'__block__': len(blocks) - 1}
+    if isinstance(value, dict):
+        return dict((k, _extract_blocks(v, blocks))
+                    for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_extract_blocks(v, blocks) for v in value]
+    return value
+
+
+def _insert_blocks(value, blocks):
+    if isinstance(value, dict):
+        if len(value) == 1 and '__block__' in value:
+            return blocks[value['__block__']]
+        return dict((k, _insert_blocks(v, blocks))
+                    for k, v in value.items())
+    if isinstance(value, list):
+        return [_insert_blocks(v, blocks) for v in value]
+    return value
+
+
+def write_body(f, body):
+    """ Write one body model (see Elements.body_models) """
+    clr, extra = _split_color(body['userData'])
+    flags = 0
+    if body['dynamic']:
+        flags |= BODY_DYNAMIC
+    if clr is not None:
+        flags |= BODY_COLOR
+    else:
+        clr = (0, 0, 0)
+    if extra is not None:
+        flags |= BODY_USERDATA
+    shapes = body.get('shapes', [])
+    f.write(BODY.pack(
+        flags, clr[0], clr[1], clr[2],
+        body['position'][0], body['position'][1], body['angle'],
+        body['angularVelocity'],
+        body['linearVelocity'][0], body['linearVelocity'][1],
+        len(shapes)))
+    for shape in shapes:
+        if shape['type'] == 'circle':
+            f.write(SHAPE.pack(
+                0, shape['density'], shape['restitution'],
+                shape['friction'], shape['radius'],
+                shape['localPosition'][0], shape['localPosition'][1], 0))
+        else:
+            vertices = shape['vertices']
+            f.write(SHAPE.pack(
+                1, shape['density'], shape['restitution'],
+                shape['friction'], 0.0, 0.0, 0.0, len(vertices)))
+            _write_floats(f, [c for v in vertices for c in v])
+    if extra is not None:
+        _write_json(f, extra)
+
+
+def write_joint(f, joint):
+    """ Write one joint model (see Elements.joint_models)
+
+        Return: False if the joint type can not be stored
+    """
+    if joint.get('type') not in JOINT_TYPES:
+        return False
+    userdata = joint['userData']
+    if joint['type'] == 'revolute':
+        x1, y1 = joint['anchor']
+        f.write(JOINT.pack(
+            0, joint['collideConnected'], joint['enableMotor'],
+            userdata is not None, joint['body1'], joint['body2'],
+            x1, y1, x1, y1, joint['motorSpeed'], joint['maxMotorTorque']))
+    else:
+        x1, y1 = joint['anchor1']
+        x2, y2 = joint['anchor2']
+        f.write(JOINT.pack(
+            1, joint['collideConnected'], False, userdata is not None,
+            joint['body1'], joint['body2'], x1, y1, x2, y2, 0.0, 0.0))
+    if userdata is not None:
+        _write_json(f, userdata)
+    return True
+
+
+def dump(f, bodies, joints, additional_vars):
+    """ Stream a world to the binary file f
+
+        Parameters:
+          bodies .......... iterable of body models
+          joints .......... iterable of joint models
+          additional_vars . dict, or a callable returning it once the
+                            bodies are written (so the saveids exist)
+    """
+    seekable = f.seekable()
+    if seekable:
+        start = f.tell()
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+    else:
+        f.write(HEADER.pack(MAGIC, VERSION, HEADER_TRAILER, 0, 0, 0))
+
+    nbodies = 0
+    for body in bodies:
+        write_body(f, body)
+        nbodies += 1
+
+    njoints = 0
+    for joint in joints:
+        if write_joint(f, joint):
+            njoints += 1
+
+    if callable(additional_vars):
+        additional_vars = additional_vars()
+    blocks = []
+    _write_json(f, _extract_blocks(additional_vars, blocks))
+    for block in blocks:
+        f.write(COUNT.pack(len(block)))
+        _write_floats(f, block)
+
+    if seekable:
+        end = f.tell()
+        f.seek(start)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, nbodies, njoints,
+                            len(blocks)))
+        f.seek(end)
+    else:
+        f.write(TRAILER.pack(nbodies, njoints, len(blocks)))
+
+
+def load(data):
+    """ Read a binary world (bytes)
+
+        Return: world model, like Elements.get_world_model
+    """
+    magic, version, flags, nbodies, njoints, nblocks = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('not a binary world')
+    if version > VERSION:
+        raise ValueError('binary world version %d is not supported'
+                         % version)
+    if flags & HEADER_TRAILER:
+        nbodies, njoints, nblocks = \
+            TRAILER.unpack_from(data, len(data) - TRAILER.size)
+    offset = HEADER.size
+
+    bodylist = []
+    for i in range(nbodies):
+        (flags, r, g, b, x, y, angle, angular, vx, vy, nshapes) = \
+            BODY.unpack_from(data, offset)
+        offset += BODY.size
+
+        shapes = []
+        for j in range(nshapes):
+            (type_, density, restitution, friction, radius, sx, sy,
+             nvertices) = SHAPE.unpack_from(data, offset)
+            offset += SHAPE.size
+            shape = {'type': SHAPE_TYPES[type_], 'density': density,
+                     'restitution': restitution, 'friction': friction}
+            if type_ == 0:
+                shape['radius'] = radius
+                shape['localPosition'] = (sx, sy)
+            else:
+                end = offset + 8 * nvertices
+                coords = _unfloats(data[offset:end])
+                offset = end
+                shape['vertices'] = list(zip(coords[0::2], coords[1::2]))
+            shapes.append(shape)
+
+        userdata = {}
+        if flags & BODY_USERDATA:
+            userdata, offset = _read_json(data, offset)
+        if flags & BODY_COLOR:
+            userdata['color'] = (r, g, b)
+        userdata['saveid'] = i + 1
+
+        bodylist.append({'dynamic': bool(flags & BODY_DYNAMIC),
+                         'position': (x, y), 'angle': angle,
+                         'angularVelocity': angular,
+                         'linearVelocity': (vx, vy),
+                         'userData': userdata, 'shapes': shapes})
+
+    jointlist = []
+    for i in range(njoints):
+        (type_, collide, motor, has_userdata, body1, body2, x1, y1, x2, y2,
+         speed, torque) = JOINT.unpack_from(data, offset)
+        offset += JOINT.size
+        userdata = None
+        if has_userdata:
+            userdata, offset = _read_json(data, offset)
+        joint = {'type': JOINT_TYPES[type_], 'body1': body1,
+                 'body2': body2, 'collideConnected': bool(collide),
+                 'userData': userdata}
+        if type_ == 0:
+            joint['anchor'] = (x1, y1)
+            joint['enableMotor'] = bool(motor)
+            joint['motorSpeed'] = speed
+            joint['maxMotorTorque'] = torque
+        else:
+            joint['anchor1'] = (x1, y1)
+            joint['anchor2'] = (x2, y2)
+        jointlist.append(joint)
+
+    additional_vars, offset = _read_json(data, offset)
+
+    blocks = []
+    for i in range(nblocks):
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        end = offset + 4 * count
+        blocks.append(_unfloats(data[offset:end]))
+        offset = end
+
+    return {'bodylist': bodylist, 'jointlist': jointlist,
+            'controllerlist': [],
+            'additional_vars': _insert_blocks(additional_vars, blocks)}
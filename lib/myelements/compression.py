@@ -0,0 +1,119 @@
+"""
+This file is part of the 'Elements' Project
+Elements is a 2D Physics API for Python (supporting Box2D2)
+
+Copyright (C) 2008, The Elements Team, <elements@linuxuser.at>
+
+Home:  http://elements.linuxuser.at
+IRC:   #elements on irc.freenode.org
+
+Code:  http://www.assembla.com/wiki/show/elements
+       svn co http://svn2.assembla.com/svn/elements
+
+License:  GPLv3 | See LICENSE for the full text
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import io
+import lzma
+import zlib
+
+# Compressed saves are told apart from plain ones by their first bytes:
+# JSON starts with '{', binary worlds with binary.MAGIC.
+
+METHODS = (None, 'zlib', 'lzma')
+
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+
+def is_zlib(head):
+    """ Return: True if head starts with a zlib stream header """
+    return len(head) >= 2 and head[0] & 0x0f == 8 and \
+        (head[0] << 8 | head[1]) % 31 == 0
+
+
+def detect(head):
+    """ Return: 'zlib', 'lzma' or None for the first bytes of a file """
+    if head[:len(XZ_MAGIC)] == XZ_MAGIC:
+        return 'lzma'
+    if is_zlib(head):
+        return 'zlib'
+    return None
+
+
+def decompress(data):
+    """ Return: data, decompressed if it is zlib or xz compressed """
+    method = detect(data)
+    if method == 'zlib':
+        return zlib.decompress(data)
+    if method == 'lzma':
+        return lzma.decompress(data)
+    return data
+
+
+class _Writer(io.RawIOBase):
+    # Binary stream writing to f; closing it finishes the compressed
+    # stream but leaves f open, like lzma.LZMAFile given a file object
+
+    def __init__(self, f, compressor=None):
+        self.f = f
+        self.compressor = compressor
+        self.written = 0  # bytes before compression
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return self.compressor is None and self.f.seekable()
+
+    def tell(self):
+        return self.f.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.f.seek(offset, whence)
+
+    def write(self, data):
+        self.written += len(data)
+        if self.compressor is None:
+            self.f.write(data)
+        else:
+            self.f.write(self.compressor.compress(bytes(data)))
+        return len(data)
+
+    def close(self):
+        if not self.closed and self.compressor is not None:
+            self.f.write(self.compressor.flush())
+        io.RawIOBase.close(self)
+
+
+def writer(f, method=None, level=None):
+    """ Wrap the binary file f so everything written is compressed
+
+        Parameters:
+          method ... None, 'zlib' or 'lzma'
+          level .... compression level, zlib 0-9 or lzma preset 0-9;
+                     None for the library default
+
+        Return: binary stream; close it to finish the compressed data,
+                f stays open
+    """
+    if method is None:
+        return _Writer(f)
+    if method == 'zlib':
+        if level is None:
+            level = zlib.Z_DEFAULT_COMPRESSION
+        return _Writer(f, zlib.compressobj(level))
+    if method == 'lzma':
+        return _Writer(f, lzma.LZMACompressor(preset=level))
+    raise ValueError('unknown compression %r, use one of %r'
+                     % (method, METHODS))
@@ -59,6 +59,7 @@ class draw_pygame(object):
         simple since we only need draw_ellipse and draw_polygon.
     """
     lineWidth = 0
+    SPRITE_COLORKEY = (255, 0, 255)
 
     def __init__(self):
         """ Load pygame.draw and pygame.Rect, and reference it for
@@ -73,9 +74,11 @@ class draw_pygame(object):
         print("* Pygame selected as renderer")
         from pygame import draw
         from pygame import Rect
+        from pygame import RLEACCEL
 
         self.draw = draw
         self.Rect = Rect
+        self.RLEACCEL = RLEACCEL
 
     def set_lineWidth(self, lw):
         """
@@ -92,6 +95,29 @@ class draw_pygame(object):
         """
         return self.surface
 
+    def new_layer(self):
+        """ Create an off-screen surface like the current one
+
+            Return: pygame.Surface
+        """
+        return self.surface.__class__(self.surface.get_size(), 0,
+                                      self.surface)
+
+    def new_sprite(self, size):
+        """ Create a small off-screen surface, transparent where nothing
+            is drawn on it
+
+            Return: pygame.Surface
+        """
+        sprite = self.surface.__class__(size, 0, self.surface)
+        sprite.fill(self.SPRITE_COLORKEY)
+        sprite.set_colorkey(self.SPRITE_COLORKEY, self.RLEACCEL)
+        return sprite
+
+    def blit(self, sprite, pt):
+        """ Draw a sprite with its top left corner at pt """
+        self.surface.blit(sprite, pt)
+
     def start_drawing(self):
         pass
 
@@ -40,7 +40,18 @@ except:
     exit()
 
 # Standard Imports
-from random import shuffle
+import io
+from array import array
+from itertools import groupby
+from math import ceil
+from math import cos
+from math import floor
+from math import sin
+from operator import itemgetter
+from random import Random
+from random import randrange
+
+import numpy
 
 # Load Elements Definitions
 from .locals import *
@@ -51,6 +62,10 @@ from . import drawing
 from . import add_objects
 from . import callbacks
 from . import camera
+from . import hittest
+from .hittest import Query_CB  # noqa: F401, it used to live here
+from . import binary
+from . import compression as compressor
 
 # Main Class
 
@@ -80,6 +95,36 @@ class Elements:
 
     mouseJoint = None
 
+    # Keep the body poses of the previous step, so draw() can
+    # interpolate between the last two steps (see get_pose)
+    interpolate = False
+    alpha = 1.0
+
+    # Background color and the cached layer drawn by draw_background()
+    background_color = None
+    static_revision = 0
+    _background = None
+    _background_key = None
+
+    # Incremented whenever bodies are added or removed (see world_changed)
+    revision = 0
+    # Incremented by every physics step
+    step_count = 0
+    _geometry = None
+    _geometry_key = None
+    _geometry_bodies = None
+
+    # save id -> body, only while json_load() runs
+    _saveid_index = None
+
+    # Sprites of sleeping bodies, see draw_bodies()
+    _sprites = {}
+    _sprites_key = None
+
+    # Bodies and joints carry a userData['uid'] that stays the same
+    # across saves, so take_delta() can name what changed
+    next_uid = 1
+
     def __init__(self, screen_size, gravity=(0.0, -9.0), ppm=100.0,
                  renderer='pygame'):
         """ Init the world with boundaries and gravity, and init colors.
@@ -100,6 +145,7 @@ class Elements:
         self.add = add_objects.Add(self)
         self.callbacks = callbacks.CallbackHandler(self)
         self.camera = camera.Camera(self)
+        self.hits = hittest.HitTest(self)
 
         # Gravity + Bodies will sleep on outside
         self.gravity = gravity
@@ -117,6 +163,12 @@ class Elements:
         # Set Pixels per Meter
         self.ppm = ppm
 
+        # Body poses before the last step (only if self.interpolate)
+        self.previous_poses = {}
+
+        # Changes since the last take_delta()
+        self.reset_changes()
+
     def set_inputUnit(self, input_unit):
         """ Change the input unit to either meter or pixels
 
@@ -164,18 +216,26 @@ class Elements:
         """
         self.display_width, self.display_height = size
 
-    def init_colors(self):
+    def init_colors(self, seed=None):
         """ Init self.colors with a fix set of hex colors
 
+            Parameters:
+              seed ... seed of the color shuffles, random if None; kept
+                       in self.color_seed, so a session can be replayed
+
             Return: -
         """
+        if seed is None:
+            seed = randrange(2 ** 32)
+        self.color_seed = seed
+        self.color_random = Random(seed)
         self.fixed_color = None
         self.cur_color = 0
         self.colors = [
             "#737934", "#729a55", "#040404", "#1d4e29", "#ae5004", "#615c57",
             "#6795ce", "#203d61", "#8f932b"
         ]
-        shuffle(self.colors)
+        self.color_random.shuffle(self.colors)
 
     def set_color(self, clr):
         """ Set a fixed color for all future Elements (until reset_color()
@@ -202,7 +262,7 @@ class Elements:
         """
         if self.cur_color == len(self.colors):
             self.cur_color = 0
-            shuffle(self.colors)
+            self.color_random.shuffle(self.colors)
 
         clr = self.colors[self.cur_color]
         if clr[0] == "#":
@@ -245,7 +305,56 @@ class Elements:
             Return: -
         """
         if self.run_physics:
+            if self.interpolate:
+                self.save_poses()
             self.world.Step(1.0 / fps, vel_iterations, pos_iterations)
+            self.step_count += 1
+
+    def save_poses(self):
+        """ Remember the current pose of every body for interpolation
+
+            Return: -
+        """
+        poses = {}
+        for body in self.world.bodies:
+            pos = body.position
+            poses[body] = (pos.x, pos.y, body.angle)
+        self.previous_poses = poses
+
+    def get_pose(self, body):
+        """ Get the pose of a body, interpolated between the previous and
+            the current step by self.alpha (0.0 .. 1.0)
+
+            Return: (x, y, angle) in meters and radians
+        """
+        pos = body.position
+        angle = body.angle
+        if self.alpha >= 1.0:
+            return (pos.x, pos.y, angle)
+
+        previous = self.previous_poses.get(body)
+        if previous is None:
+            return (pos.x, pos.y, angle)
+
+        px, py, pa = previous
+        a = self.alpha
+        return (px + (pos.x - px) * a, py + (pos.y - py) * a,
+                pa + (angle - pa) * a)
+
+    def interpolate_point(self, body, point):
+        """ Move a world point attached to body along with the
+            interpolated pose of that body (see get_pose)
+
+            Return: (x, y) in meters
+        """
+        pos = body.position
+        x, y, angle = self.get_pose(body)
+        dx = point[0] - pos.x
+        dy = point[1] - pos.y
+        da = angle - body.angle
+        c = cos(da)
+        s = sin(da)
+        return (x + c * dx - s * dy, y + s * dx + c * dy)
 
     def translate_coord(self, point):
         """ Flips the coordinates in another coordinate system orientation,
@@ -298,6 +407,20 @@ class Elements:
         sx, sy = self.translate_coord((x, y))
         return (sx * self.camera.scale_factor, sy * self.camera.scale_factor)
 
+    def to_screen_array(self, points):
+        """ to_screen() for an (n, 2) array of world coordinates
+            (pixels)
+        """
+        points = points - self.screen_offset_pixel
+
+        if self.inputAxis_x_left:
+            points[:, 0] = self.display_width - points[:, 0]
+
+        if self.inputAxis_y_down:
+            points[:, 1] = self.display_height - points[:, 1]
+
+        return points * self.camera.scale_factor
+
     def meter_to_screen(self, i):
         return i * self.ppm * self.camera.scale_factor
 
@@ -305,38 +428,16 @@ class Elements:
         """ Check if given point (screen coordinates) is inside any body.
             If yes, return all found bodies, if not found return False
         """
-        sx, sy = self.to_world(search_point)
-        sx /= self.ppm
-        sy /= self.ppm
-
-        f = area / self.camera.scale_factor
-
-        AABB = box2d.b2AABB()
-        AABB.lowerBound = (sx - f, sy - f)
-        AABB.upperBound = (sx + f, sy + f)
-
-        query_cb = Query_CB()
-
-        self.world.QueryAABB(query_cb, AABB)
-
-        bodylist = []
-        for s in query_cb.fixtures:
-            body = s.body
-            if body is None:
-                continue
-            if not include_static:
-                if body.type == box2d.b2_staticBody or body.mass == 0.0:
-                    continue
+        return self.hits.bodies_at(search_point, include_static, area)
 
-            if s.TestPoint((sx, sy)):
-                bodylist.append(body)
-
-        return bodylist
-
-    def draw(self):
+    def draw(self, alpha=1.0):
         """ If a drawing method is specified, this function passes the objects
             to the module in pixels.
 
+            Parameters:
+              alpha ... how far to interpolate between the previous and the
+                        current physics step (0.0 .. 1.0), see get_pose
+
             Return: True if the objects were successfully drawn
               False if the renderer was not set or another error occurred
         """
@@ -355,53 +456,27 @@ class Elements:
                                                p1.y * self.ppm)),
                                stopTrack=False)
 
+        self.alpha = alpha
+
         # Walk through all known elements
         self.renderer.start_drawing()
 
-        for body in self.world.bodies:
-            xform = body.transform
-            shape = body.fixtures
-            angle = body.angle
-
-            if shape:
-                userdata = body.userData
-                if 'color' in userdata:
-                    clr = userdata['color']
-                else:
-                    clr = self.colors[0]
-
-            for shape in body.fixtures:
-                type_ = shape.type
-
-                if type_ == box2d.b2Shape.e_circle:
-                    position = box2d.b2Mul(xform, shape.shape.pos)
-
-                    pos = self.to_screen((position.x * self.ppm,
-                                          position.y * self.ppm))
-
-                    self.renderer.draw_circle(
-                        clr, pos, self.meter_to_screen(shape.shape.radius),
-                        angle)
-
-                elif type_ == box2d.b2Shape.e_polygon:
-                    points = []
-                    for v in shape.shape.vertices:
-                        pt = box2d.b2Mul(xform, v)
-                        x, y = self.to_screen((pt.x * self.ppm,
-                                               pt.y * self.ppm))
-                        points.append([x, y])
+        # Static bodies are on the cached background layer, if there is one
+        cached = self.draw_background()
 
-                    self.renderer.draw_polygon(clr, points)
-
-                else:
-                    print("unknown shape type:%d" % shape.type)
+        if cached:
+            bodies = [body for body in self.world.bodies
+                      if body.type != box2d.b2_staticBody]
+        else:
+            bodies = list(self.world.bodies)
+        self.draw_bodies(bodies)
 
         for joint in self.world.joints:
-            p2 = joint.anchorA
-            p2 = self.to_screen((p2.x * self.ppm, p2.y * self.ppm))
+            p2 = self.interpolate_point(joint.bodyA, joint.anchorA)
+            p2 = self.to_screen((p2[0] * self.ppm, p2[1] * self.ppm))
 
-            p1 = joint.anchorB
-            p1 = self.to_screen((p1.x * self.ppm, p1.y * self.ppm))
+            p1 = self.interpolate_point(joint.bodyB, joint.anchorB)
+            p1 = self.to_screen((p1[0] * self.ppm, p1[1] * self.ppm))
 
             if p1 == p2:
                 self.renderer.draw_circle((255, 255, 255), p1, 2, 0)
@@ -416,6 +491,515 @@ class Elements:
 
         return True
 
+    def draw_body(self, body):
+        """ Pass the fixtures of one body to the renderer, in pixels
+
+            Return: -
+        """
+        shape = body.fixtures
+        x, y, angle = self.get_pose(body)
+        c = cos(angle)
+        s = sin(angle)
+
+        if shape:
+            userdata = body.userData
+            if 'color' in userdata:
+                clr = userdata['color']
+            else:
+                clr = self.colors[0]
+
+        for shape in body.fixtures:
+            type_ = shape.type
+
+            if type_ == box2d.b2Shape.e_circle:
+                vx, vy = shape.shape.pos
+                px = x + c * vx - s * vy
+                py = y + s * vx + c * vy
+
+                pos = self.to_screen((px * self.ppm, py * self.ppm))
+
+                self.renderer.draw_circle(
+                    clr, pos, self.meter_to_screen(shape.shape.radius),
+                    angle)
+
+            elif type_ == box2d.b2Shape.e_polygon:
+                points = []
+                for vx, vy in shape.shape.vertices:
+                    px = x + c * vx - s * vy
+                    py = y + s * vx + c * vy
+                    points.append(list(self.to_screen((px * self.ppm,
+                                                       py * self.ppm))))
+
+                self.renderer.draw_polygon(clr, points)
+
+            else:
+                print("unknown shape type:%d" % shape.type)
+
+    def draw_bodies(self, bodies):
+        """ Pass the fixtures of many bodies to the renderer. All vertices
+            are moved to the screen in one batch, using the local vertices
+            cached by get_geometry() and the (interpolated) body poses
+
+            Return: -
+        """
+        local, owner, shapes = self.get_geometry(bodies)
+        if not shapes:
+            return
+
+        poses = numpy.array([self.get_pose(body) for body in bodies])
+        angles = poses[:, 2]
+        c = numpy.cos(angles)[owner]
+        s = numpy.sin(angles)[owner]
+
+        points = numpy.empty(local.shape)
+        points[:, 0] = poses[owner, 0] + c * local[:, 0] - s * local[:, 1]
+        points[:, 1] = poses[owner, 1] + s * local[:, 0] + c * local[:, 1]
+        points = self.to_screen_array(points * self.ppm)
+
+        # Bodies that sleep don't move, draw them once to a sprite and
+        # blit that until they wake up or the camera changes
+        sprites = hasattr(self.renderer, 'new_sprite')
+        key = (self.revision, self.screen_offset_pixel,
+               self.camera.scale_factor)
+        if key != self._sprites_key:
+            self._sprites = {}
+            self._sprites_key = key
+
+        for index, body_shapes in groupby(shapes, itemgetter(1)):
+            body = bodies[index]
+            if sprites and not body.awake:
+                sprite = self._sprites.get(body)
+                if sprite is None:
+                    sprite = self._draw_sprite(list(body_shapes), points,
+                                               angles)
+                    self._sprites[body] = sprite
+                self.renderer.blit(*sprite)
+            else:
+                self._sprites.pop(body, None)
+                self._draw_shapes(body_shapes, points, angles)
+
+    def _draw_shapes(self, shapes, points, angles, offset=(0, 0)):
+        scale = self.ppm * self.camera.scale_factor
+        for circle, index, start, end, radius, clr in shapes:
+            if circle:
+                self.renderer.draw_circle(clr, points[start] - offset,
+                                          radius * scale, angles[index])
+            else:
+                self.renderer.draw_polygon(clr, points[start:end] - offset)
+
+    def _draw_sprite(self, shapes, points, angles):
+        # Draw the shapes of one body to a sprite just big enough for them
+        scale = self.ppm * self.camera.scale_factor
+        low = []
+        high = []
+        for circle, index, start, end, radius, clr in shapes:
+            pad = radius * scale + 1
+            low.append(points[start:end].min(axis=0) - pad)
+            high.append(points[start:end].max(axis=0) + pad)
+        left, top = [floor(v) for v in numpy.min(low, axis=0)]
+        right, bottom = [ceil(v) for v in numpy.max(high, axis=0)]
+
+        surface = self.renderer.get_surface()
+        sprite = self.renderer.new_sprite((right - left + 1,
+                                           bottom - top + 1))
+        self.renderer.set_surface(sprite)
+        self._draw_shapes(shapes, points, angles, (left, top))
+        self.renderer.set_surface(surface)
+        return (sprite, (left, top))
+
+    def get_geometry(self, bodies):
+        """ Get the local vertices (and circle centers) of all fixtures of
+            the bodies, rebuilt only if the bodies changed
+
+            Return: (vertices, owner, shapes)
+              vertices .. (n, 2) array of local coordinates in meters
+              owner ..... (n,) array, index of the body of each vertex
+              shapes .... list of (circle, body index, start, end, radius,
+                          color), the vertices of the fixture are
+                          vertices[start:end]
+        """
+        if self._geometry_key == self.revision and \
+                self._geometry_bodies == bodies:
+            return self._geometry
+
+        vertices = []
+        owner = []
+        shapes = []
+        for index, body in enumerate(bodies):
+            userdata = body.userData
+            if userdata and 'color' in userdata:
+                clr = userdata['color']
+            else:
+                clr = self.colors[0]
+
+            for fixture in body.fixtures:
+                start = len(vertices)
+                if fixture.type == box2d.b2Shape.e_circle:
+                    vertices.append(tuple(fixture.shape.pos))
+                    shapes.append((True, index, start, start + 1,
+                                   fixture.shape.radius, clr))
+                elif fixture.type == box2d.b2Shape.e_polygon:
+                    vertices.extend(fixture.shape.vertices)
+                    shapes.append((False, index, start, len(vertices), 0,
+                                   clr))
+                else:
+                    print("unknown shape type:%d" % fixture.type)
+                    continue
+                owner.extend([index] * (len(vertices) - start))
+
+        self._geometry = (numpy.array(vertices, float).reshape(-1, 2),
+                          numpy.array(owner, int), shapes)
+        self._geometry_key = self.revision
+        self._geometry_bodies = bodies
+        return self._geometry
+
+    def world_changed(self):
+        """ Tell the caches that bodies were added or removed
+
+            Return: -
+        """
+        self.revision += 1
+
+    def destroy_body(self, body):
+        """ Destroy a body (and its joints)
+
+            Return: -
+        """
+        self.destroy_bodies([body])
+
+    def destroy_bodies(self, bodies):
+        """ Destroy some bodies (and their joints), as one change of
+            the world
+
+            Return: -
+        """
+        for body in bodies:
+            if body.type == box2d.b2_staticBody:
+                self.static_changed()
+            for edge in body.joints:
+                self._forget(edge.joint, self.dirty_joints,
+                             self.removed_joints)
+            self._forget(body, self.dirty_bodies, self.removed_bodies)
+            self.world.DestroyBody(body)
+        self.world_changed()
+
+    def body_created(self, body):
+        """ Give a new body its uid and mark it for the next delta
+
+            Return: -
+        """
+        self.dirty_bodies[self._give_uid(body)] = body
+
+    def create_joint(self, jointDef):
+        """ Create a joint, give it a uid and mark it for the next delta
+
+            Return: the joint
+        """
+        joint = self.world.CreateJoint(jointDef)
+        self.dirty_joints[self._give_uid(joint)] = joint
+        return joint
+
+    def destroy_joint(self, joint):
+        """ Destroy a joint, remembering it for the next delta
+
+            Return: -
+        """
+        self._forget(joint, self.dirty_joints, self.removed_joints)
+        self.world.DestroyJoint(joint)
+
+    def reset_changes(self):
+        """ Forget the changes collected for the next delta
+
+            Return: -
+        """
+        self.dirty_bodies = {}   # uid -> body, created since the last delta
+        self.dirty_joints = {}   # uid -> joint
+        self.removed_bodies = set()
+        self.removed_joints = set()
+        # uid -> pose of each dynamic body as of the last delta (or
+        # load), to find the bodies that moved since
+        self.logged_poses = {}
+        for body in self.world.bodies:
+            if body.type == box2d.b2_dynamicBody and \
+                    isinstance(body.userData, dict) and \
+                    'uid' in body.userData:
+                self.logged_poses[body.userData['uid']] = _pose(body)
+
+    def _give_uid(self, item):
+        # Return: the uid of a body or joint, giving it one if needed
+        if not isinstance(item.userData, dict):
+            item.userData = {}
+        uid = item.userData.get('uid')
+        if uid is None:
+            uid = item.userData['uid'] = self.next_uid
+        self.next_uid = max(self.next_uid, uid + 1)
+        return uid
+
+    def _forget(self, item, dirty, removed):
+        if isinstance(item.userData, dict) and 'uid' in item.userData:
+            uid = item.userData['uid']
+            dirty.pop(uid, None)
+            removed.add(uid)
+
+    def _uid(self, body):
+        if body == self.world.groundBody:
+            return 0
+        return body.userData['uid']
+
+    def take_delta(self, additional_vars=None):
+        """ Collect what changed since the last call: the bodies and
+            joints created (with their shapes), the poses of the dynamic
+            bodies that moved (running, paused, asleep by now or not),
+            and the uids of the removed ones. Joints name their bodies
+            by uid.
+
+            Parameters:
+              additional_vars ... copied into the delta
+
+            Return: delta dict for apply_delta, or None if nothing
+                    changed
+        """
+        moved = []
+        logged_poses = self.logged_poses
+        for body in self.world.bodies:
+            if body.type != box2d.b2_dynamicBody:
+                continue
+            uid = body.userData.get('uid')
+            if uid in self.dirty_bodies:
+                continue
+            if uid is None or logged_poses.get(uid) != _pose(body):
+                moved.append(body)
+
+        if not (moved or self.dirty_bodies or self.dirty_joints
+                or self.removed_bodies or self.removed_joints):
+            return None
+
+        bodies = []
+        for body in self.dirty_bodies.values():
+            bodies.append(self._body_model(body))
+        for body in moved:
+            self._give_uid(body)
+            bodies.append(self._body_model(body, with_shapes=False))
+        for modelbody in bodies:
+            modelbody['userData'] = dict(modelbody['userData'])
+            modelbody['userData'].pop('saveid', None)
+
+        delta = {'bodies': bodies,
+                 'joints': [self._joint_model(joint, self._uid)
+                            for joint in self.dirty_joints.values()],
+                 'removed_bodies': sorted(self.removed_bodies),
+                 'removed_joints': sorted(self.removed_joints),
+                 'additional_vars': _copy_vars(additional_vars or {})}
+        for modeljoint in delta['joints']:
+            modeljoint['userData'] = dict(modeljoint['userData'])
+        self.reset_changes()
+        return delta
+
+    def apply_delta(self, delta):
+        """ Apply a delta from take_delta() to the world it was taken
+            from (or to a load of a save of it)
+
+            Return: -
+        """
+        bodies = {0: self.world.groundBody}
+        for body in self.world.bodies:
+            if isinstance(body.userData, dict) and 'uid' in body.userData:
+                bodies[body.userData['uid']] = body
+        joints = {}
+        for joint in self.world.joints:
+            if isinstance(joint.userData, dict) and 'uid' in joint.userData:
+                joints[joint.userData['uid']] = joint
+
+        for uid in delta['removed_joints']:
+            if uid in joints:
+                self.world.DestroyJoint(joints.pop(uid))
+        for uid in delta['removed_bodies']:
+            if uid in bodies:
+                self.destroy_body(bodies.pop(uid))
+
+        for modelbody in delta['bodies']:
+            uid = modelbody['userData']['uid']
+            body = bodies.get(uid)
+            if body is None:
+                if 'shapes' in modelbody:
+                    bodies[uid] = self._create_body(modelbody)
+                continue
+            body.transform = (modelbody['position'], modelbody['angle'])
+            body.angularVelocity = modelbody['angularVelocity']
+            body.linearVelocity = modelbody['linearVelocity']
+            body.userData.update(modelbody['userData'])
+
+        for modeljoint in delta['joints']:
+            if modeljoint['userData']['uid'] not in joints:
+                self._create_joint(modeljoint, bodies.get)
+
+        if not hasattr(self, 'additional_vars'):
+            self.additional_vars = {}
+        self.additional_vars.update(delta['additional_vars'])
+
+        self.previous_poses = {}
+        self.static_changed()
+        self.world_changed()
+        self.reset_changes()
+
+    def snapshot(self, models=True):
+        """ Capture the world in memory, for restore()
+
+            Parameters:
+              models ... also keep the models of bodies and joints, so
+                         restore() can bring back destroyed ones
+
+            Return: dict with the body uids, their poses and velocities
+                    as a numpy array (x, y, angle, vx, vy, omega) and
+                    their awake flags, the joint uids and the models
+        """
+        bodies = [body for body in self.world.bodies
+                  if body != self.world.groundBody]
+        uids = numpy.fromiter((self._give_uid(body) for body in bodies),
+                              numpy.int64, len(bodies))
+        poses = numpy.empty((len(bodies), 6))
+        awake = numpy.empty(len(bodies), bool)
+        for i, body in enumerate(bodies):
+            position = body.position
+            velocity = body.linearVelocity
+            poses[i] = (position.x, position.y, body.angle,
+                        velocity.x, velocity.y, body.angularVelocity)
+            awake[i] = body.awake
+
+        joints = [joint for joint in self.world.joints
+                  if joint != self.mouseJoint]
+        joint_uids = numpy.fromiter(
+            (self._give_uid(joint) for joint in joints),
+            numpy.int64, len(joints))
+
+        snapshot = {'uids': uids, 'poses': poses, 'awake': awake,
+                    'joint_uids': joint_uids}
+        if models:
+            snapshot['bodies'] = {}
+            for uid, body in zip(uids.tolist(), bodies):
+                modelbody = self._body_model(body)
+                modelbody['userData'] = dict(body.userData)
+                snapshot['bodies'][uid] = modelbody
+            snapshot['joints'] = {}
+            for uid, joint in zip(joint_uids.tolist(), joints):
+                modeljoint = self._joint_model(joint, self._uid)
+                modeljoint['userData'] = dict(joint.userData)
+                snapshot['joints'][uid] = modeljoint
+        return snapshot
+
+    def restore(self, snapshot, models=None):
+        """ Put the world back into the state of a snapshot(): bodies and
+            joints made since are destroyed, destroyed ones are made
+            again and every body gets its pose and velocity back
+
+            Parameters:
+              snapshot ... from snapshot()
+              models ..... snapshot(models=True) to take the body and
+                           joint models from, default: snapshot itself
+
+            Return: -
+        """
+        if models is None:
+            models = snapshot
+        uids = snapshot['uids'].tolist()
+        joint_uids = set(snapshot['joint_uids'].tolist())
+
+        if self.mouseJoint:
+            self.add.remove_mouseJoint()
+
+        for joint in self.world.joints:
+            if self._give_uid(joint) not in joint_uids:
+                self.destroy_joint(joint)
+
+        bodies = {}
+        wanted = set(uids)
+        for body in self.world.bodies:
+            if body == self.world.groundBody:
+                continue
+            uid = self._give_uid(body)
+            if uid in wanted:
+                bodies[uid] = body
+            else:
+                self.destroy_body(body)
+
+        for uid in uids:
+            if uid not in bodies:
+                modelbody = dict(models['bodies'][uid])
+                modelbody['userData'] = dict(modelbody['userData'])
+                bodies[uid] = self._create_body(modelbody)
+                if not modelbody['dynamic']:
+                    self.static_changed()
+
+        for uid, pose, awake in zip(uids, snapshot['poses'].tolist(),
+                                    snapshot['awake'].tolist()):
+            body = bodies[uid]
+            body.transform = ((pose[0], pose[1]), pose[2])
+            body.linearVelocity = (pose[3], pose[4])
+            body.angularVelocity = pose[5]
+            body.awake = awake
+            self.dirty_bodies[uid] = body
+
+        existing = set(self._give_uid(joint) for joint in self.world.joints)
+        bodies[0] = self.world.groundBody
+        for uid in joint_uids - existing:
+            modeljoint = dict(models['joints'][uid])
+            modeljoint['userData'] = dict(modeljoint['userData'])
+            joint = self._create_joint(modeljoint, bodies.get)
+            if joint is not None:
+                self.dirty_joints[uid] = joint
+
+        self.previous_poses = {}
+        self.world_changed()
+
+    def set_background(self, clr):
+        """ Set a background color. The background and all static bodies
+            are then drawn once to a cached layer, which draw() blits
+            instead of drawing them every frame (pygame renderer only)
+
+            Parameters:
+              clr ... RGB ((r), (g), (b)) or None for no background
+
+            Return: -
+        """
+        self.background_color = clr
+        self.static_changed()
+
+    def static_changed(self):
+        """ Tell the background layer that static bodies were added or
+            removed, so it is drawn again
+
+            Return: -
+        """
+        self.static_revision += 1
+
+    def draw_background(self):
+        """ Blit the background layer, drawing it first if the static
+            bodies, the camera or the surface size changed
+
+            Return: True if the layer (with the static bodies) was drawn
+        """
+        if self.background_color is None or \
+                not hasattr(self.renderer, 'new_layer'):
+            return False
+
+        surface = self.renderer.get_surface()
+        key = (self.static_revision, self.screen_offset_pixel,
+               self.camera.scale_factor, surface.get_size())
+
+        if key != self._background_key:
+            layer = self.renderer.new_layer()
+            layer.fill(self.background_color)
+            self.renderer.set_surface(layer)
+            for body in self.world.bodies:
+                if body.type == box2d.b2_staticBody:
+                    self.draw_body(body)
+            self.renderer.set_surface(surface)
+            self._background = layer
+            self._background_key = key
+
+        surface.blit(self._background, (0, 0))
+        return True
+
     def set_pin_motor_radius(self, radius):
         self.PIN_MOTOR_RADIUS = radius
 
@@ -476,88 +1060,143 @@ class Elements:
 
         return variables
 
-    def json_save(self, path, additional_vars={}, serialize=False):
+    def json_save(self, path, additional_vars={}, serialize=False,
+                  compression=None, level=None):
+        """ Save the world as JSON, written body by body and joint by
+            joint so the whole world is never held as one string
+
+            compression and level are passed to compression.writer
+        """
         import json
 
-        worldmodel = self.get_world_model(additional_vars, serialize)
-        self.world.groundBody.userData = {"saveid": 0}
+        raw = open(path, 'wb')
+        try:
+            f = io.TextIOWrapper(
+                compressor.writer(raw, compression, level), 'utf-8')
+            f.write('{"bodylist": [')
+            for i, modelbody in enumerate(self.body_models()):
+                if i:
+                    f.write(', ')
+                f.write(json.dumps(modelbody))
+            f.write('], "jointlist": [')
+            for i, modeljoint in enumerate(self.joint_models()):
+                if i:
+                    f.write(', ')
+                f.write(json.dumps(modeljoint))
+            f.write('], "controllerlist": [], "additional_vars": ')
+            # the float arrays (trajectories) as lists, as they were
+            # saved before binary_save
+            json.dump(self.serialize_vars(additional_vars, serialize), f,
+                      default=list)
+            f.write('}')
+            f.close()
+        finally:
+            raw.close()
+
+            for body in self.world.bodies:
+                body.userData.pop('saveid', None)  # remove temporary data
 
-        f = open(path, 'w')
-        f.write(json.dumps(worldmodel))
-        f.close()
+    def get_world_model(self, additional_vars={}, serialize=False):
+        worldmodel = {}
+        worldmodel['bodylist'] = list(self.body_models())
+        worldmodel['jointlist'] = list(self.joint_models())
+        worldmodel['controllerlist'] = []
+        worldmodel['additional_vars'] = \
+            self.serialize_vars(additional_vars, serialize)
+        return worldmodel
 
+    def model_snapshot(self, additional_vars={}, serialize=False):
+        """ Return: a world model that shares nothing mutable with the
+            world or additional_vars, so it can be written out by
+            another thread while the world keeps running
+        """
+        worldmodel = self.get_world_model(
+            _copy_vars(additional_vars), serialize)
+        for modelbody in worldmodel['bodylist']:
+            modelbody['userData'] = dict(modelbody['userData'])
+        for modeljoint in worldmodel['jointlist']:
+            if isinstance(modeljoint['userData'], dict):
+                modeljoint['userData'] = dict(modeljoint['userData'])
         for body in self.world.bodies:
-            del body.userData['saveid']  # remove temporary data
+            body.userData.pop('saveid', None)  # remove temporary data
+        return worldmodel
 
-    def get_world_model(self, additional_vars={}, serialize=False):
-        worldmodel = {}
+    def body_models(self):
+        """ Generate the model of every body, numbering the bodies with
+            a temporary userData['saveid'] on the way
+        """
         save_id_index = 1
         self.world.groundBody.userData = {"saveid": 0}
 
-        bodylist = []
         for body in self.world.bodies:
             if body == self.world.groundBody:
                 continue
             body.userData["saveid"] = save_id_index  # set temporary data
             save_id_index += 1
-            shapelist = body.fixtures
-            modelbody = {}
-            modelbody['position'] = body.position.tuple
-            modelbody['dynamic'] = body.type == box2d.b2_dynamicBody
-            modelbody['userData'] = body.userData
-            modelbody['angle'] = body.angle
-            modelbody['angularVelocity'] = body.angularVelocity
-            modelbody['linearVelocity'] = body.linearVelocity.tuple
-            if shapelist and len(shapelist) > 0:
-                shapes = []
-                for shape in shapelist:
-                    modelshape = {}
-                    modelshape['density'] = shape.density
-                    modelshape['restitution'] = shape.restitution
-                    modelshape['friction'] = shape.friction
-                    shapename = shape.shape.__class__.__name__
-                    if shapename == "b2CircleShape":
-                        modelshape['type'] = 'circle'
-                        modelshape['radius'] = shape.shape.radius
-                        modelshape['localPosition'] = shape.shape.pos.tuple
-                    if shapename == "b2PolygonShape":
-                        modelshape['type'] = 'polygon'
-                        modelshape['vertices'] = shape.shape.vertices
-                    shapes.append(modelshape)
-                modelbody['shapes'] = shapes
-
-            bodylist.append(modelbody)
-
-        worldmodel['bodylist'] = bodylist
-
-        jointlist = []
-
+            yield self._body_model(body)
+
+    def _body_model(self, body, with_shapes=True):
+        shapelist = body.fixtures
+        modelbody = {}
+        modelbody['position'] = body.position.tuple
+        modelbody['dynamic'] = body.type == box2d.b2_dynamicBody
+        modelbody['userData'] = body.userData
+        modelbody['angle'] = body.angle
+        modelbody['angularVelocity'] = body.angularVelocity
+        modelbody['linearVelocity'] = body.linearVelocity.tuple
+        if with_shapes and shapelist and len(shapelist) > 0:
+            shapes = []
+            for shape in shapelist:
+                modelshape = {}
+                modelshape['density'] = shape.density
+                modelshape['restitution'] = shape.restitution
+                modelshape['friction'] = shape.friction
+                shapename = shape.shape.__class__.__name__
+                if shapename == "b2CircleShape":
+                    modelshape['type'] = 'circle'
+                    modelshape['radius'] = shape.shape.radius
+                    modelshape['localPosition'] = shape.shape.pos.tuple
+                if shapename == "b2PolygonShape":
+                    modelshape['type'] = 'polygon'
+                    modelshape['vertices'] = shape.shape.vertices
+                shapes.append(modelshape)
+            modelbody['shapes'] = shapes
+        return modelbody
+
+    def joint_models(self):
+        """ Generate the model of every joint, body_models must have
+            been run through first
+        """
         for joint in self.world.joints:
-            modeljoint = {}
-
-            if joint.__class__.__name__ == "b2RevoluteJoint":
-                modeljoint['type'] = 'revolute'
-                modeljoint['anchor'] = joint.anchorA.tuple
-                modeljoint['enableMotor'] = joint.motorEnabled
-                modeljoint['motorSpeed'] = joint.motorSpeed
-                modeljoint['maxMotorTorque'] = joint.GetMaxMotorTorque()
-            elif joint.__class__.__name__ == "b2DistanceJoint":
-                modeljoint['type'] = 'distance'
-                modeljoint['anchor1'] = joint.anchorA.tuple
-                modeljoint['anchor2'] = joint.anchorB.tuple
-
-            modeljoint['body1'] = joint.bodyA.userData['saveid']
-            modeljoint['body2'] = joint.bodyB.userData['saveid']
-            modeljoint['collideConnected'] = joint.collideConnected
-            modeljoint['userData'] = joint.userData
-
-            jointlist.append(modeljoint)
-
-        worldmodel['jointlist'] = jointlist
-
-        controllerlist = []
-        worldmodel['controllerlist'] = controllerlist
-
+            yield self._joint_model(
+                joint, lambda body: body.userData['saveid'])
+
+    def _joint_model(self, joint, body_id):
+        # body_id(body) names the bodies of the joint
+        modeljoint = {}
+
+        if joint.__class__.__name__ == "b2RevoluteJoint":
+            modeljoint['type'] = 'revolute'
+            modeljoint['anchor'] = joint.anchorA.tuple
+            modeljoint['enableMotor'] = joint.motorEnabled
+            modeljoint['motorSpeed'] = joint.motorSpeed
+            modeljoint['maxMotorTorque'] = joint.GetMaxMotorTorque()
+        elif joint.__class__.__name__ == "b2DistanceJoint":
+            modeljoint['type'] = 'distance'
+            modeljoint['anchor1'] = joint.anchorA.tuple
+            modeljoint['anchor2'] = joint.anchorB.tuple
+
+        modeljoint['body1'] = body_id(joint.bodyA)
+        modeljoint['body2'] = body_id(joint.bodyB)
+        modeljoint['collideConnected'] = joint.collideConnected
+        modeljoint['userData'] = joint.userData
+
+        return modeljoint
+
+    def serialize_vars(self, additional_vars, serialize=False):
+        """ Return: additional_vars, with the bodies in trackinfo
+            replaced by their saveids if serialize is set
+        """
         if serialize:
             addvars = additional_vars
             trackinfo = addvars['trackinfo']
@@ -575,81 +1214,87 @@ class Elements:
 
             additional_vars['trackinfo'] = trackinfo
 
-        worldmodel['additional_vars'] = additional_vars
+        return additional_vars
 
-        return worldmodel
+    def binary_save(self, path, additional_vars={}, serialize=False,
+                    compression=None, level=None):
+        """ Save the world in the compact binary format (see binary.py),
+            streaming the records to the file
+
+            Parameters:
+              path ............ file name
+              additional_vars . dict saved along; array('f') values are
+                                stored as raw float blocks
+              serialize ....... replace the bodies in trackinfo by ids
+              compression ..... None, 'zlib' or 'lzma'
+              level ........... compression level (0-9)
+        """
+        raw = open(path, 'wb')
+        try:
+            f = compressor.writer(raw, compression, level)
+            binary.dump(f, self.body_models(), self.joint_models(),
+                        lambda: self.serialize_vars(additional_vars,
+                                                    serialize))
+            f.close()
+        finally:
+            raw.close()
+
+            for body in self.world.bodies:
+                body.userData.pop('saveid', None)  # remove temporary data
+
+    def load(self, path, serialized=False):
+        """ Load a world saved by json_save or binary_save, the format
+            and compression are told apart by the first bytes of the file
+        """
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+        self.load_data(data, serialized)
+
+    def load_data(self, data, serialized=False):
+        """ Load a world from the contents (bytes) of a save file """
+        data = compressor.decompress(data)
+        if binary.is_binary(data):
+            worldmodel = binary.load(data)
+        else:
+            import json
+            worldmodel = json.loads(data.decode('utf-8'))
+        self.load_world_model(worldmodel, serialized)
 
     def json_load(self, path, serialized=False):
         import json
 
+        f = open(path, 'rb')
+        data = compressor.decompress(f.read())
+        f.close()
+        worldmodel = json.loads(data.decode('utf-8'))
+        self.load_world_model(worldmodel, serialized)
+
+    def load_world_model(self, worldmodel, serialized=False):
+        """ Replace the world by a world model (see get_world_model) """
         self.world.groundBody.userData = {"saveid": 0}
 
-        f = open(path, 'r')
-        worldmodel = json.loads(f.read())
-        f.close()
         # clean world
+        self.previous_poses = {}
+        self.static_changed()
+        self.world_changed()
         for joint in self.world.joints:
             self.world.DestroyJoint(joint)
         for body in self.world.bodies:
             if body != self.world.groundBody:
                 self.world.DestroyBody(body)
 
+        # index the bodies by their save id while creating them, so the
+        # joints and trackinfo find them without scanning all bodies
+        self._saveid_index = {0: self.world.groundBody}
+
         # load bodies
         for body in worldmodel['bodylist']:
-            bodyDef = box2d.b2BodyDef()
-            if body['dynamic']:
-                bodyDef.type = box2d.b2_dynamicBody
-            bodyDef.position = body['position']
-            bodyDef.userData = body['userData']
-            bodyDef.angle = body['angle']
-            newBody = self.world.CreateBody(bodyDef)
-            # _logger.debug(newBody)
-            newBody.angularVelocity = body['angularVelocity']
-            newBody.linearVelocity = body['linearVelocity']
-            if 'shapes' in body:
-                for shape in body['shapes']:
-                    if shape['type'] == 'polygon':
-                        polyDef = box2d.b2FixtureDef()
-                        polyShape = box2d.b2PolygonShape()
-                        polyShape.vertices = shape['vertices']
-                        polyDef.shape = polyShape
-                        polyDef.density = shape['density']
-                        polyDef.restitution = shape['restitution']
-                        polyDef.friction = shape['friction']
-                        newBody.CreateFixture(polyDef)
-                    if shape['type'] == 'circle':
-                        circleDef = box2d.b2FixtureDef()
-                        circleShape = box2d.b2CircleShape()
-                        circleShape.radius = shape['radius']
-                        circleShape.pos = shape['localPosition']
-                        circleDef.shape = circleShape
-                        circleDef.density = shape['density']
-                        circleDef.restitution = shape['restitution']
-                        circleDef.friction = shape['friction']
-                        newBody.CreateFixture(circleDef)
+            newBody = self._create_body(body)
+            self._saveid_index[body['userData']['saveid']] = newBody
 
         for joint in worldmodel['jointlist']:
-            if joint['type'] == 'distance':
-                jointDef = box2d.b2DistanceJointDef()
-                body1 = self.getBodyWithSaveId(joint['body1'])
-                anch1 = joint['anchor1']
-                body2 = self.getBodyWithSaveId(joint['body2'])
-                anch2 = joint['anchor2']
-                jointDef.collideConnected = joint['collideConnected']
-                jointDef.Initialize(body1, body2, anch1, anch2)
-                jointDef.userData = joint['userData']
-                self.world.CreateJoint(jointDef)
-            if joint['type'] == 'revolute':
-                jointDef = box2d.b2RevoluteJointDef()
-                body1 = self.getBodyWithSaveId(joint['body1'])
-                body2 = self.getBodyWithSaveId(joint['body2'])
-                anchor = joint['anchor']
-                jointDef.Initialize(body1, body2, anchor)
-                jointDef.userData = joint['userData']
-                jointDef.motorEnabled = joint['enableMotor']
-                jointDef.motorSpeed = joint['motorSpeed']
-                jointDef.maxMotorTorque = joint['maxMotorTorque']
-                self.world.CreateJoint(jointDef)
+            self._create_joint(joint, self.getBodyWithSaveId)
 
         self.additional_vars = {}
         addvars = {}
@@ -669,22 +1314,106 @@ class Elements:
                     addvars['trackinfo'][key][1] = None
 
         self.additional_vars = addvars
+        self._saveid_index = None
 
         for body in self.world.bodies:
             del body.userData['saveid']  # remove temporary data
 
+        # saves from older versions have no uids
+        for body in self.world.bodies:
+            if body != self.world.groundBody:
+                self._give_uid(body)
+        for joint in self.world.joints:
+            self._give_uid(joint)
+        self.reset_changes()
+
+    def _create_body(self, body):
+        # Create a body from its model (see body_models)
+        bodyDef = box2d.b2BodyDef()
+        if body['dynamic']:
+            bodyDef.type = box2d.b2_dynamicBody
+        bodyDef.position = body['position']
+        bodyDef.userData = body['userData']
+        bodyDef.angle = body['angle']
+        newBody = self.world.CreateBody(bodyDef)
+        # _logger.debug(newBody)
+        newBody.angularVelocity = body['angularVelocity']
+        newBody.linearVelocity = body['linearVelocity']
+        if 'shapes' in body:
+            for shape in body['shapes']:
+                if shape['type'] == 'polygon':
+                    polyDef = box2d.b2FixtureDef()
+                    polyShape = box2d.b2PolygonShape()
+                    polyShape.vertices = shape['vertices']
+                    polyDef.shape = polyShape
+                    polyDef.density = shape['density']
+                    polyDef.restitution = shape['restitution']
+                    polyDef.friction = shape['friction']
+                    newBody.CreateFixture(polyDef)
+                if shape['type'] == 'circle':
+                    circleDef = box2d.b2FixtureDef()
+                    circleShape = box2d.b2CircleShape()
+                    circleShape.radius = shape['radius']
+                    circleShape.pos = shape['localPosition']
+                    circleDef.shape = circleShape
+                    circleDef.density = shape['density']
+                    circleDef.restitution = shape['restitution']
+                    circleDef.friction = shape['friction']
+                    newBody.CreateFixture(circleDef)
+        if 'uid' in body['userData']:
+            self.next_uid = max(self.next_uid, body['userData']['uid'] + 1)
+        return newBody
+
+    def _create_joint(self, joint, get_body):
+        # Create a joint from its model (see joint_models), get_body
+        # finds a body by the id used in the model
+        if joint['type'] == 'distance':
+            jointDef = box2d.b2DistanceJointDef()
+            body1 = get_body(joint['body1'])
+            anch1 = joint['anchor1']
+            body2 = get_body(joint['body2'])
+            anch2 = joint['anchor2']
+            jointDef.collideConnected = joint['collideConnected']
+            jointDef.Initialize(body1, body2, anch1, anch2)
+            jointDef.userData = joint['userData']
+        elif joint['type'] == 'revolute':
+            jointDef = box2d.b2RevoluteJointDef()
+            body1 = get_body(joint['body1'])
+            body2 = get_body(joint['body2'])
+            anchor = joint['anchor']
+            jointDef.Initialize(body1, body2, anchor)
+            jointDef.userData = joint['userData']
+            jointDef.motorEnabled = joint['enableMotor']
+            jointDef.motorSpeed = joint['motorSpeed']
+            jointDef.maxMotorTorque = joint['maxMotorTorque']
+        else:
+            return None
+        if isinstance(joint['userData'], dict) and 'uid' in joint['userData']:
+            self.next_uid = max(self.next_uid, joint['userData']['uid'] + 1)
+        return self.world.CreateJoint(jointDef)
+
     def getBodyWithSaveId(self, saveid):
+        if self._saveid_index is not None:
+            return self._saveid_index.get(saveid)
         for body in self.world.bodies:
             if body.userData['saveid'] == saveid:
                 return body
 
 
-class Query_CB(box2d.b2QueryCallback):
+def _pose(body):
+    # position, angle and velocities, all a delta logs of a moved body
+    position = body.position
+    velocity = body.linearVelocity
+    return (position.x, position.y, body.angle,
+            velocity.x, velocity.y, body.angularVelocity)
 
-    def __init__(self):
-        box2d.b2QueryCallback.__init__(self)
-        self.fixtures = []
 
-    def ReportFixture(self, fixture):
-        self.fixtures.append(fixture)
-        return True
+def _copy_vars(value):
+    # Copy the containers and float arrays, the rest is left shared
+    if isinstance(value, dict):
+        return dict((k, _copy_vars(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [_copy_vars(v) for v in value]
+    if isinstance(value, array):
+        return array(value.typecode, value)
+    return value
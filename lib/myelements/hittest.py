@@ -0,0 +1,153 @@
+"""
+This file is part of the 'Elements' Project
+Elements is a 2D Physics API for Python (supporting Box2D2)
+
+Copyright (C) 2008, The Elements Team, <elements@linuxuser.at>
+
+Home:  http://elements.linuxuser.at
+IRC:   #elements on irc.freenode.org
+
+Code:  http://www.assembla.com/wiki/show/elements
+       svn co http://svn2.assembla.com/svn/elements
+
+License:  GPLv3 | See LICENSE for the full text
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import Box2D as box2d
+
+
+class Query_CB(box2d.b2QueryCallback):
+
+    def __init__(self):
+        box2d.b2QueryCallback.__init__(self)
+        self.fixtures = []
+
+    def ReportFixture(self, fixture):
+        self.fixtures.append(fixture)
+        return True
+
+
+class RayCast_CB(box2d.b2RayCastCallback):
+
+    def __init__(self):
+        box2d.b2RayCastCallback.__init__(self)
+        self.fixtures = []
+
+    def ReportFixture(self, fixture, point, normal, fraction):
+        self.fixtures.append(fixture)
+        return 1.0  # keep going, report every fixture on the ray
+
+
+class HitTest:
+    """ Point queries against the bodies of the world
+
+        One query callback is reused for every query, and results are
+        remembered until the world changes: bodies added or removed
+        (parent.revision) or a physics step taken (parent.step_count).
+        Asking again for the same point in the same frame is a dict
+        lookup.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.query_cb = Query_CB()
+        self.raycast_cb = RayCast_CB()
+        self.cache = {}
+        self.cache_key = None
+
+    def bodies_at(self, search_point, include_static=False, area=0.01):
+        """ Find the bodies at a point
+
+            Parameters:
+              search_point ... (x, y) in screen coordinates
+              include_static . also return static bodies
+              area ........... half the size of the searched square, in
+                               meters at camera scale 1
+
+            Return: list of bodies whose fixtures contain the point
+        """
+        parent = self.parent
+        sx, sy = parent.to_world(search_point)
+        sx /= parent.ppm
+        sy /= parent.ppm
+
+        f = area / parent.camera.scale_factor
+
+        key = (parent.revision, parent.step_count)
+        if key != self.cache_key:
+            self.cache = {}
+            self.cache_key = key
+        query = (sx, sy, include_static, f)
+        bodylist = self.cache.get(query)
+        if bodylist is not None:
+            return list(bodylist)
+
+        AABB = box2d.b2AABB()
+        AABB.lowerBound = (sx - f, sy - f)
+        AABB.upperBound = (sx + f, sy + f)
+
+        query_cb = self.query_cb
+        query_cb.fixtures = []
+        parent.world.QueryAABB(query_cb, AABB)
+
+        bodylist = []
+        for s in query_cb.fixtures:
+            body = s.body
+            if body is None:
+                continue
+            if not include_static:
+                if body.type == box2d.b2_staticBody or body.mass == 0.0:
+                    continue
+
+            if s.TestPoint((sx, sy)):
+                bodylist.append(body)
+        query_cb.fixtures = []
+
+        self.cache[query] = bodylist
+        return list(bodylist)
+
+    def bodies_along(self, start, end, include_static=False):
+        """ Find the bodies a segment crosses, or ends in
+
+            Parameters:
+              start, end ..... (x, y) in screen coordinates
+              include_static . also return static bodies
+
+            Return: list of bodies, each once
+        """
+        parent = self.parent
+        bodylist = self.bodies_at(end, include_static)
+
+        p1 = parent.to_world(start)
+        p2 = parent.to_world(end)
+        if p1 == p2:
+            return bodylist
+        p1 = (p1[0] / parent.ppm, p1[1] / parent.ppm)
+        p2 = (p2[0] / parent.ppm, p2[1] / parent.ppm)
+
+        raycast_cb = self.raycast_cb
+        raycast_cb.fixtures = []
+        parent.world.RayCast(raycast_cb, p1, p2)
+
+        for s in raycast_cb.fixtures:
+            body = s.body
+            if body is None or body in bodylist:
+                continue
+            if not include_static:
+                if body.type == box2d.b2_staticBody or body.mass == 0.0:
+                    continue
+            bodylist.append(body)
+        raycast_cb.fixtures = []
+
+        return bodylist
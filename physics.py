@@ -14,6 +14,7 @@ Code:   http://dev.laptop.org/git?p=activities/physics
 License:  GPLv3 http://gplv3.fsf.org/
 """
 import os
+import time
 
 import gi
 gi.require_version('Gtk', '3.0')
@@ -24,9 +25,19 @@ import pygame.locals
 import pygame.color
 import Box2D as box2d
 from lib.myelements import elements
+from lib.myelements import binary
+from lib.myelements import compression
 import tools
 from bridge import Bridge
-from gettext import gettext as _
+from bridge import CANVAS_SIZE
+from hud import Hud
+from trajectory import Trajectory
+from profiler import FrameProfiler
+from saving import Autosaver
+from saving import SaveWorker
+from saving import load_autosave
+from replay import Recorder
+from replay import read_log
 import logging
 
 class PhysicsGame:
@@ -44,45 +55,255 @@ class PhysicsGame:
         self.box2d = box2d
         self.opening_queue = None
         self.running = True
+        self.headless = False
         self.initialise = True
         self.full_pos_list = []
         self.tracked_bodies = 0
         self.cost = 0
         self.capacity = 1
+        self.bridge = None
+        self.screen = None
 
         self.trackinfo = {}
         self.box2d_fps = 50
+        # Catch up at most this many physics steps per rendered frame
+        self.max_steps_per_frame = 5
+        self.saver = SaveWorker()
+        # Journal space is tight, saves are compressed (None, 'zlib' or
+        # 'lzma', level 0-9)
+        self.save_compression = 'zlib'
+        self.save_compression_level = 6
+        self.writing = False  # write_file is waiting for the worker
+        # Crash recovery, see create_autosaver
+        self.autosaver = None
+        # BRIDGE_RECORD=FILE records the session, see replay.py
+        self.recorder = None
+        # the mouse as the tools see it, sampled once per frame
+        self.mouse = ((0, 0), (False, False, False))
 
     def set_game_fps(self, fps):
         self.box2d_fps = fps
 
     def write_file(self, path):
-        # Saving to journal
+        # Saving to journal. The world is copied first (not streamed
+        # from, like Elements.binary_save does), because GTK handlers
+        # run while the worker writes and may change it.
         logging.debug("write_file called")
-        additional_data = {
+        snapshot = self.world.model_snapshot(self.save_data())
+
+        def write(f):
+            out = compression.writer(f, self.save_compression,
+                                     self.save_compression_level)
+            binary.dump(out, snapshot['bodylist'], snapshot['jointlist'],
+                        snapshot['additional_vars'])
+            out.close()
+
+        # Sugar copies the file to the journal as soon as we return, so
+        # wait for it, but keep GTK responsive while the worker writes
+        job = self.saver.save(path, write)
+        if self.writing:
+            # called again from a GTK event handled by the loop below
+            # (e.g. the activity closing): the job is queued after the
+            # first one, wait for it without nesting another loop
+            job.wait()
+            return
+        self.writing = True
+        try:
+            while not job.wait(0.01):
+                while Gtk.events_pending():
+                    Gtk.main_iteration()
+        finally:
+            self.writing = False
+
+    def save_data(self):
+        # the game state saved along with the world
+        cost, capacity = self.cost, self.capacity
+        if self.bridge is not None:
+            cost, capacity = self.bridge.cost, self.bridge.capacity
+        return {
             'trackinfo': self.trackinfo,
-            'full_pos_list': self.full_pos_list,
+            'full_pos_list': [t.points for t in self.full_pos_list],
             'tracked_bodies': self.tracked_bodies,
-            'cost': self.bridge.cost,
-            'capacity': self.bridge.capacity
+            'cost': cost,
+            'capacity': capacity,
+            # the banks and the train are placed on the canvas, a design
+            # only runs the same at the size it was built at
+            'size': list(self.screen.get_size()) if self.screen else None
         }
-        self.world.json_save(path, additional_data)
+
+    def create_autosaver(self):
+        # Autosave to the instance directory every few seconds. The files
+        # are deleted when the game ends normally, so if they exist on
+        # start, the last session of this activity crashed.
+        if self.activity is None:
+            return None
+        path = os.path.join(self.activity.get_activity_root(), 'instance',
+                            'autosave-%s' % self.activity.get_id())
+        return Autosaver(self.saver, path,
+                         compression=self.save_compression,
+                         level=self.save_compression_level)
 
     def read_file(self, path):
         # Loading from journal
         logging.debug("read_file called")
         self.opening_queue = path
 
+    def load_file(self, path):
+        self.world.load(path, serialized=True)
+        self.load_save_data()
+
+    def load_save_data(self):
+        if 'full_pos_list' in self.world.additional_vars:
+            self.full_pos_list = \
+                [Trajectory.decode(points) for points in
+                 self.world.additional_vars['full_pos_list']]
+        if 'trackinfo' in self.world.additional_vars:
+            self.trackinfo = self.world.additional_vars['trackinfo']
+        if 'tracked_bodies' in self.world.additional_vars:
+            self.tracked_bodies = \
+                self.world.additional_vars['tracked_bodies']
+        if 'cost' in self.world.additional_vars:
+            self.cost = self.world.additional_vars['cost']
+        if 'capacity' in self.world.additional_vars:
+            self.capacity = self.world.additional_vars['capacity']
+
+    def mouse_pos(self):
+        return self.mouse[0]
+
+    def mouse_pressed(self):
+        return self.mouse[1]
+
+    def create_bridge(self):
+        self.bridge = Bridge(self)
+        self.bridge.create_world()
+        self.bridge.cost = self.cost
+        self.bridge.stress = 0
+        self.bridge.capacity = self.capacity
+
+    def run_headless(self, path, size=None, max_time=60.0):
+        """ Simulate a saved design without a display
+
+            Loads the design at path, sends a train and steps the world
+            as fast as possible, without drawing, until the train exits,
+            falls off or max_time seconds of simulated time have passed.
+            The world has the canvas size the design was saved with,
+            unless size is given.
+
+            Return: dict with 'passed', 'fell', 'steps', 'time',
+                    'peak_stress', 'joints_broken' and 'cost'
+        """
+        self.headless = True
+        with open(path, 'rb') as f:
+            data = f.read()
+        if size is None:
+            size = saved_size(data)
+        self.screen = pygame.Surface(size)
+
+        self.world = elements.Elements(size)
+        self.world.renderer.set_surface(self.screen)
+        self.world.run_physics = False
+        self.world.load_data(data, serialized=True)
+        self.load_save_data()
+
+        self.create_bridge()
+
+        self.bridge.create_train()
+        self.world.run_physics = True
+
+        steps = 0
+        max_steps = int(max_time * self.box2d_fps)
+        while steps < max_steps:
+            self.world.update(fps=self.box2d_fps)
+            self.bridge.for_each_frame(draw=False)
+            steps += 1
+            if self.bridge.train_exit or self.bridge.train_off_screen:
+                break
+
+        return {'passed': self.bridge.level_completed,
+                'fell': self.bridge.train_off_screen,
+                'steps': steps,
+                'time': steps / float(self.box2d_fps),
+                'peak_stress': self.bridge.peak_stress,
+                'joints_broken': self.bridge.joints_broken,
+                'cost': self.bridge.cost}
+
+    def run_replay(self, path):
+        """ Replay a session recorded with BRIDGE_RECORD (see replay.py)
+            as fast as possible, without a display
+
+            Return: dict with 'frames', 'steps', 'seconds' (wall time),
+                    'passed', 'joints_broken' and 'cost'
+        """
+        header, frames = read_log(path)
+        size = tuple(header['size'])
+
+        pygame.font.init()
+        self.headless = True
+        self.screen = pygame.Surface(size)
+        self.box2d_fps = header['fps']
+        self.profiler = FrameProfiler(pygame.font.Font(None, 24))
+
+        self.start_world(header['world'], header['seed'])
+
+        self.toolList = {}
+        for c in tools.allTools:
+            self.toolList[c.name] = c(self)
+        self.currentTool = self.toolList[tools.allTools[0].name]
+        self.create_bridge()
+
+        actions = {'start': self.start_button_up,
+                   'new_train': self.create_new_train_button_up,
+                   'restart': self.restart_button_up}
+        steps = 0
+        start = time.perf_counter()
+        for elapsed, count, pos, pressed, events, names in frames:
+            for name in names:
+                actions[name]()
+            self.mouse = (pos, pressed)
+            for event in events:
+                self.currentTool.handleEvents(event, self.bridge)
+            for i in range(count):
+                self.world.update(fps=self.box2d_fps)
+                self.bridge.for_each_frame(draw=False)
+            if not self.world.run_physics:
+                self.bridge.reset_joint_stress()
+            self.currentTool.draw()
+            steps += count
+
+        return {'frames': len(frames),
+                'steps': steps,
+                'seconds': time.perf_counter() - start,
+                'passed': self.bridge.level_completed,
+                'joints_broken': self.bridge.joints_broken,
+                'cost': self.bridge.cost}
+
+    def start_world(self, data, seed):
+        # a new world from save data (bytes), with a given color seed
+        self.world = elements.Elements(self.screen.get_size())
+        self.world.renderer.set_surface(self.screen)
+        self.world.init_colors(seed)
+        self.world.run_physics = False
+        self.world.load_data(data, serialized=True)
+        self.load_save_data()
+
     def run(self):
         pygame.init()
         self.screen = pygame.display.get_surface()
         self.font = pygame.font.Font(None, 42)  # font object
+        self.hud = Hud(self.font)
+        # P shows the frame profile, BRIDGE_PROFILE_CSV logs every frame
+        self.profiler = FrameProfiler(
+            pygame.font.Font(None, 24),
+            csv_path=os.environ.get('BRIDGE_PROFILE_CSV'))
         self.debug = True
 
 
         # set up the world (instance of Elements)
         self.world = elements.Elements(self.screen.get_size())
         self.world.renderer.set_surface(self.screen)
+        self.world.interpolate = True
+        # the sky, drawn with the ground to a cached layer by world.draw()
+        self.world.set_background((80, 160, 240))
 
         self.joystickobject = None
 
@@ -102,30 +323,40 @@ class PhysicsGame:
         if self.opening_queue:
             path = self.opening_queue.encode('ascii', 'convert')
             if os.path.exists(path):
-                self.world.json_load(path, serialized=True)
-                if 'full_pos_list' in self.world.additional_vars:
-                    self.full_pos_list = \
-                        self.world.additional_vars['full_pos_list']
-                if 'trackinfo' in self.world.additional_vars:
-                    self.trackinfo = self.world.additional_vars['trackinfo']
-                if 'tracked_bodies' in self.world.additional_vars:
-                    self.tracked_bodies = \
-                        self.world.additional_vars['tracked_bodies']
-                if 'cost' in self.world.additional_vars:
-                    self.cost = self.world.additional_vars['cost']
-                if 'capacity' in self.world.additional_vars:
-                    self.capacity = self.world.additional_vars['capacity']
-
-
-        self.bridge = Bridge(self)
-        self.bridge.create_world()
-        self.bridge.cost = self.cost
-        self.bridge.stress = 0
-        self.bridge.capacity = self.capacity
+                self.load_file(path)
+
+        self.autosaver = self.create_autosaver()
+        if self.autosaver is not None and \
+                os.path.exists(self.autosaver.path):
+            try:
+                replayed = load_autosave(self.world, self.autosaver.path)
+                self.load_save_data()
+                print('Recovered autosave, %d changes replayed' % replayed)
+            except Exception as e:
+                print('Could not recover autosave: %s' % e)
+
+        if os.environ.get('BRIDGE_RECORD'):
+            self.recorder = Recorder(os.environ['BRIDGE_RECORD'])
+            # play on the world as it is written to the log, so Box2D
+            # sees the bodies in the same order as when replaying
+            data = self.recorder.start(self)
+            self.start_world(data, self.world.color_seed)
+            self.world.interpolate = True
+            self.world.set_background((80, 160, 240))
+
+        self.create_bridge()
 
         self.running = True
         t = pygame.time.get_ticks()
 
+        # Physics runs at a fixed box2d_fps; every frame we step as often
+        # as the elapsed wall time requires and draw the bodies
+        # interpolated between the last two steps
+        step_ms = 1000.0 / self.box2d_fps
+        accumulator = 0.0
+        elapsed = 0
+        profiler = self.profiler
+
         while self.running:
             if (pygame.time.get_ticks() - t) > 1500:
                 t = pygame.time.get_ticks()
@@ -134,101 +365,125 @@ class PhysicsGame:
                 Gtk.main_iteration()
             if not self.running:
                 break
+            profiler.mark('gtk')
 
-            for event in pygame.event.get():
+            self.mouse = (pygame.mouse.get_pos(), pygame.mouse.get_pressed())
+            events = pygame.event.get()
+            for event in events:
                 self.currentTool.handleEvents(event, self.bridge)
-            # Clear Display
-            self.screen.fill((80, 160, 240))  # 255 for white
+            profiler.mark('events')
 
             # Update & Draw World
-            self.world.update()
-            self.world.draw()
+            alpha = 1.0
+            steps = 0
             if self.world.run_physics:
-                self.bridge.for_each_frame()
-                bodies_present = len(self.world.world.bodies)
+                accumulator += elapsed
+                while accumulator >= step_ms:
+                    self.world.update(fps=self.box2d_fps)
+                    profiler.mark('update')
+                    self.bridge.for_each_frame(draw=False)
+                    profiler.mark('stress')
+                    accumulator -= step_ms
+                    steps += 1
+                    if steps == self.max_steps_per_frame:
+                        # We can't keep up, drop the time we are behind
+                        accumulator = 0.0
+                        break
+                alpha = accumulator / step_ms
+            else:
+                # joints may get destroyed while paused
+                accumulator = 0.0
+                self.bridge.reset_joint_stress()
 
+            self.world.draw(alpha)
+            profiler.mark('draw')
+            if self.world.run_physics:
+                self.bridge.draw_joints()
+                profiler.mark('stress')
                 for key, info in self.trackinfo.items():
-                    # [host_body, tracker, color, destroyed?]
-                    body = info[1]
-                    if info[3] is False: # Not destroyed
+                    # [host_body, tracker, color, destroyed?, trackdex]
+                    if info[3] is False:  # Not destroyed
                         trackdex = info[4]
-
-                        def to_screen(pos):
-                            px = self.world.meter_to_screen(
-                                pos[0])
-                            py = self.world.meter_to_screen(
-                                pos[1])
-                            py = self.world.renderer.get_surface() \
-                                .get_height() - py
-                            return (px, py)
-
-                        x = body.position.x
-                        y = body.position.y
-                        tupled_pos = to_screen((x,y))
-                        posx = tupled_pos[0]
-                        posy = tupled_pos[1]
+                        posx, posy = self.tracker_position(info[1])
                         try:
-                            self.full_pos_list[trackdex].append(posx)
-                            self.full_pos_list[trackdex].append(posy)
+                            self.full_pos_list[trackdex].append(posx, posy)
                         except IndexError:
-                            self.full_pos_list.append([posx, posy])     
-
+                            self.full_pos_list.append(
+                                Trajectory([posx, posy]))
+                profiler.mark('tracking')
 
             # draw output from tools
             self.currentTool.draw()
+            profiler.mark('tools')
 
             # Print all the text on the screen
-            text = self.font.render(_("Total Cost: %d") %
-                                    self.bridge.cost, True, (0, 0, 0))
-            textpos = text.get_rect(left=12, top=12)
-            self.screen.blit(text, textpos)
-            ratio = self.bridge.stress * 100 / self.bridge.capacity
-            text = self.font.render(_("Stress: %d%%") % ratio, True, (0, 0, 0))
-            textpos = text.get_rect(left=12, top=53)
-            self.screen.blit(text, textpos)
-
-            if self.bridge.train_off_screen:
-                text = self.font.render(
-                    _("Train fell off the screen, press R to try again!"),
-                    True, (0, 0, 0))
-            elif self.bridge.level_completed:
-                text = self.font.render(
-                    _("Level completed, well done!!"),
-                    True, (0, 0, 0))
-                if self.bridge.train_exit:
-                    text = self.font.render(
-                        _("Press T to send another train."),
-                        True, (0, 0, 0))
-            else:
-                text = self.font.render(
-                    _("Press the Spacebar to start/pause."),
-                    True, (0, 0, 0))
-            textpos = text.get_rect(left=12, top=94)
-            self.screen.blit(text, textpos)
+            self.hud.update(self.bridge)
+            self.hud.draw(self.screen)
+            profiler.mark('hud')
+            profiler.draw(self.screen)
+            profiler.mark('overlay')
+
+            if self.autosaver is not None:
+                self.autosaver.tick(self.world, self.save_data)
+                profiler.mark('autosave')
 
             # Flip Display
             pygame.display.flip()
-
-            # Try to stay at 30 FPS
-            self.clock.tick(30)  # originally 50
+            profiler.mark('flip')
+
+            # Try to stay at 30 FPS, physics speed does not depend on it
+            elapsed = self.clock.tick(30)  # originally 50
+            profiler.mark('wait')
+            if self.recorder is not None:
+                pos, pressed = self.mouse
+                self.recorder.frame(elapsed, steps, pos, pressed, events)
+            profiler.end_frame()
+
+        self.profiler.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.autosaver is not None:
+            self.autosaver.remove()
+        self.saver.close()
+
+    def tracker_position(self, body):
+        # screen position of a body, for its trajectory
+        px = self.world.meter_to_screen(body.position.x)
+        py = self.world.renderer.get_surface().get_height() \
+            - self.world.meter_to_screen(body.position.y)
+        return (px, py)
 
     def setTool(self, tool):
         self.currentTool.cancel()
         self.currentTool = self.toolList[tool]
 
     def start_button_up(self):
+        if self.recorder is not None:
+            self.recorder.action('start')
         self.bridge.create_train()
         self.world.run_physics = not self.world.run_physics
 
     def create_new_train_button_up(self):
+        if self.recorder is not None:
+            self.recorder.action('new_train')
         if self.bridge.train_exit:
             self.bridge.create_train(force=True)
     
     def restart_button_up(self):
+        if self.recorder is not None:
+            self.recorder.action('restart')
         if self.bridge.train_off_screen:
             self.bridge.restart()
 
 
+def saved_size(data):
+    # the canvas size a save (bytes) was made at; bodies are loaded in
+    # meters, whatever the size of the world they are loaded into
+    world = elements.Elements(CANVAS_SIZE)
+    world.load_data(data, serialized=True)
+    return tuple(world.additional_vars.get('size') or CANVAS_SIZE)
+
+
 def main():
     toolbarheight = 75
     tabheight = 45
@@ -0,0 +1,107 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import csv
+import os
+import time
+from collections import deque
+
+# The phases of PhysicsGame.run, in the order they are shown
+PHASES = ['gtk', 'events', 'update', 'stress', 'draw', 'tracking',
+          'tools', 'hud', 'overlay', 'autosave', 'flip', 'wait']
+
+
+class FrameProfiler:
+    """ Times the phases of every frame of the main loop
+
+        mark(phase) adds the time since the previous mark to phase, so a
+        phase can be marked several times in one frame (like the physics
+        steps). The averages over the last window frames can be shown as
+        an overlay, and every frame can be logged to a CSV file, which is
+        rotated to path.1 after csv_rows rows.
+    """
+
+    def __init__(self, font=None, window=60, csv_path=None, csv_rows=10000):
+        self.font = font
+        self.visible = False
+        self.times = dict((phase, deque(maxlen=window)) for phase in PHASES)
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        self.last = time.perf_counter()
+
+        self.csv_path = csv_path
+        self.csv_rows = csv_rows
+        self.csv_file = None
+        self.csv_writer = None
+        self.rows = 0
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.frame[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        for phase, seconds in self.frame.items():
+            self.times[phase].append(seconds)
+        if self.csv_path:
+            self.log(self.frame)
+        self.frame = dict.fromkeys(PHASES, 0.0)
+
+    def average(self, phase):
+        """ Return: average time of phase over the window, in ms """
+        times = self.times[phase]
+        if not times:
+            return 0.0
+        return sum(times) * 1000.0 / len(times)
+
+    def log(self, frame):
+        if self.csv_writer is None or self.rows >= self.csv_rows:
+            if self.csv_file is not None:
+                self.csv_file.close()
+                os.replace(self.csv_path, self.csv_path + '.1')
+            self.csv_file = open(self.csv_path, 'w', newline='')
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(['time'] + PHASES)
+            self.rows = 0
+        self.csv_writer.writerow(
+            ['%.3f' % time.time()]
+            + ['%.3f' % (frame[phase] * 1000.0) for phase in PHASES])
+        self.rows += 1
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
+
+    def draw(self, screen, left=12, top=140, color=(0, 0, 0)):
+        if not self.visible or self.font is None:
+            return
+        total = 0.0
+        lines = []
+        for phase in PHASES:
+            ms = self.average(phase)
+            total += ms
+            lines.append('%-8s %6.2f ms' % (phase, ms))
+        lines.append('%-8s %6.2f ms' % ('frame', total))
+
+        for line in lines:
+            text = self.font.render(line, True, color)
+            screen.blit(text, (left, top))
+            top += text.get_height()
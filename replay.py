@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Record a play session and replay it exactly, without a display.
+
+With BRIDGE_RECORD=FILE set, the game writes the world it started from,
+the color seed of Elements.init_colors and, for every frame, the time it
+took, the physics steps it ran, the mouse and the pygame events handed
+to Tool.handleEvents (tool switches included) and the toolbar buttons
+pressed. Replaying feeds the frames back as fast as possible through
+PhysicsGame.run_replay, so a session reported from the field can be
+reproduced and timed.
+
+Usage: python3 replay.py [-r REPEAT] FILE
+"""
+import argparse
+import base64
+import io
+import json
+import sys
+
+import pygame
+
+VERSION = 1
+
+
+def encode_event(event):
+    attrs = {}
+    for key, value in event.dict.items():
+        if isinstance(value, tuple):
+            value = list(value)
+        if value is None or isinstance(value, (bool, int, float, str, list)):
+            attrs[key] = value
+    return [event.type, attrs]
+
+
+def decode_event(item):
+    kind, attrs = item
+    for key, value in attrs.items():
+        if isinstance(value, list):
+            attrs[key] = tuple(value)
+    return pygame.event.Event(kind, attrs)
+
+
+class Recorder:
+    """ Writes a session to a log, one JSON line per frame
+
+        The first line is the header: format version, color seed,
+        physics rate, screen size and the start world (a compressed
+        binary save, base64). A frame is
+        [milliseconds, steps, mouse x, mouse y, mouse buttons, events,
+         actions], where events and actions are left out when empty.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        self.actions = []
+
+    def start(self, game):
+        """ Write the header, with the world as it is now
+
+            Return: the world as written (compressed binary save)
+        """
+        from lib.myelements import binary
+        from lib.myelements import compression
+
+        snapshot = game.world.model_snapshot(game.save_data())
+        data = io.BytesIO()
+        out = compression.writer(data, 'zlib')
+        binary.dump(out, snapshot['bodylist'], snapshot['jointlist'],
+                    snapshot['additional_vars'])
+        out.close()
+
+        self.f = open(self.path, 'w')
+        self.f.write(json.dumps({
+            'version': VERSION,
+            'seed': game.world.color_seed,
+            'fps': game.box2d_fps,
+            'size': list(game.screen.get_size()),
+            'world': base64.b64encode(data.getvalue()).decode('ascii'),
+        }) + '\n')
+        return data.getvalue()
+
+    def action(self, name):
+        """ Remember a toolbar button for the current frame """
+        self.actions.append(name)
+
+    def frame(self, elapsed, steps, pos, pressed, events):
+        buttons = sum(1 << i for i, down in enumerate(pressed[:3]) if down)
+        record = [elapsed, steps, pos[0], pos[1], buttons]
+        if events or self.actions:
+            record.append([encode_event(event) for event in events])
+        if self.actions:
+            record.append(self.actions)
+            self.actions = []
+        self.f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def read_log(path):
+    """ Return: (header, list of frames) of a recorded session, frames
+        as (milliseconds, steps, (x, y), (left, middle, right),
+        events, actions)
+    """
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header['version'] > VERSION:
+            raise ValueError('replay version %d is not supported'
+                             % header['version'])
+        header['world'] = base64.b64decode(header['world'])
+        frames = []
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # the game did not get to finish the line
+            elapsed, steps, x, y, buttons = record[:5]
+            pressed = tuple(bool(buttons & 1 << i) for i in range(3))
+            events = []
+            if len(record) > 5:
+                events = [decode_event(item) for item in record[5]]
+            actions = record[6] if len(record) > 6 else []
+            frames.append((elapsed, steps, (x, y), pressed, events,
+                           actions))
+    return header, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay a recorded Bridge session headless.')
+    parser.add_argument('log', help='file recorded with BRIDGE_RECORD')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='replay this many times')
+    args = parser.parse_args()
+
+    from physics import PhysicsGame
+
+    for i in range(args.repeat):
+        result = PhysicsGame().run_replay(args.log)
+        sys.stdout.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
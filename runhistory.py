@@ -0,0 +1,111 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from array import array
+from bisect import bisect_right
+
+
+class RunHistory:
+    """ Keyframes of a train run, so it can be scrubbed through
+
+        Every interval physics steps a keyframe (Elements.snapshot
+        without models: packed uid, pose and joint arrays) is kept, and
+        in between only the joints that broke, as parallel arrays of
+        step numbers and joint uids. seek() restores the keyframe at or
+        before a step and simulates forward, breaking the logged joints
+        at their steps instead of asking the stress again.
+    """
+
+    def __init__(self, world, interval=25):
+        self.world = world
+        self.interval = interval
+        # models of every body and joint at the start, to bring back
+        # the joints that broke after a keyframe
+        self.base = world.snapshot()
+        self.keyframes = [self.base]
+        self.keyframe_steps = [0]
+        self.break_steps = array('I')
+        self.break_uids = array('I')
+        self.step = 0  # the step the world is at
+        self.end = 0   # the last step recorded
+
+    def record_step(self, broken=()):
+        """ Log a physics step that was just taken, with the joints it
+            broke (already destroyed)
+        """
+        if self.step < self.end:
+            self.truncate(self.step)
+        self.step += 1
+        self.end = self.step
+        for uid in broken:
+            self.break_steps.append(self.step)
+            self.break_uids.append(uid)
+        if self.step % self.interval == 0:
+            self.keyframes.append(self.world.snapshot(models=False))
+            self.keyframe_steps.append(self.step)
+
+    def truncate(self, step):
+        """ Forget everything after step (the run went another way) """
+        keep = bisect_right(self.keyframe_steps, step)
+        del self.keyframes[keep:]
+        del self.keyframe_steps[keep:]
+        keep = bisect_right(self.break_steps, step)
+        del self.break_steps[keep:]
+        del self.break_uids[keep:]
+        self.end = step
+
+    def breaks_until(self, step):
+        """ Return: number of joints broken up to step """
+        return bisect_right(self.break_steps, step)
+
+    def seek(self, step, fps):
+        """ Put the world at a recorded step
+
+            Parameters:
+              step ... clamped to 0 .. end
+              fps .... physics rate the run was recorded with
+
+            Return: the step the world is at now
+        """
+        step = max(0, min(step, self.end))
+        index = bisect_right(self.keyframe_steps, step) - 1
+        if not (self.keyframe_steps[index] <= self.step <= step):
+            # going back, or past the next keyframe
+            self.world.restore(self.keyframes[index], self.base)
+            self.step = self.keyframe_steps[index]
+
+        joints = {}
+        for joint in self.world.world.joints:
+            if isinstance(joint.userData, dict):
+                joints[joint.userData.get('uid')] = joint
+
+        position = self.breaks_until(self.step)
+        run_physics = self.world.run_physics
+        self.world.run_physics = True
+        while self.step < step:
+            self.world.update(fps=fps)
+            self.step += 1
+            while position < len(self.break_steps) and \
+                    self.break_steps[position] == self.step:
+                joint = joints.pop(self.break_uids[position], None)
+                if joint is not None:
+                    self.world.destroy_joint(joint)
+                position += 1
+        self.world.run_physics = run_physics
+        self.world.previous_poses = {}
+        return self.step
@@ -0,0 +1,274 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Crash safe saving of worlds on a worker thread.
+
+The game takes a snapshot of the world model (see
+Elements.model_snapshot) on the GTK thread, which only copies numbers,
+and a SaveWorker turns it into a file. Files are written next to the
+target, fsynced and renamed into place, so the target is either the old
+or the new save, never a truncated one.
+
+An Autosaver keeps a checkpoint plus an append-only log of the changes
+since (Elements.take_delta), so saving every few seconds only costs
+what changed.
+"""
+import json
+import os
+import threading
+import time
+import queue
+
+from lib.myelements import binary
+from lib.myelements import compression
+
+
+def atomic_write(path, write, mode='wb'):
+    """ Call write(f) with a temporary file in the directory of path,
+        then replace path with it
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = os.path.join(directory,
+                       '.%s.%d.tmp' % (os.path.basename(path), os.getpid()))
+    try:
+        with open(tmp, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    # make the rename itself durable
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def append(path, data):
+    """ Append data (bytes) to path and fsync it """
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class SaveJob:
+    """ A pending save, wait() blocks until it is on disk """
+
+    def __init__(self, path, run):
+        self.path = path
+        self.run = run
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """ Return: True once the file is written; re-raises the error
+            of a failed save
+        """
+        if not self.done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+class SaveWorker:
+    """ Runs SaveJobs one after the other on a daemon thread """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+
+    def save(self, path, write):
+        """ Queue write(f) to be atomically written to path
+
+            Return: SaveJob
+        """
+        return self.submit(path, lambda: atomic_write(path, write))
+
+    def submit(self, path, run):
+        """ Queue run(), which writes path, after the jobs queued before
+
+            Return: SaveJob
+        """
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run,
+                                           name='SaveWorker', daemon=True)
+            self.thread.start()
+        job = SaveJob(path, run)
+        self.jobs.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            try:
+                job.run()
+            except Exception as e:
+                print('Saving %s failed: %s' % (job.path, e))
+                job.error = e
+            job.done.set()
+
+    def close(self):
+        """ Finish the queued saves and stop the thread """
+        if self.thread is not None and self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+        self.thread = None
+
+
+def _encode(value):
+    # JSON for the float arrays of trajectories
+    return list(value)
+
+
+class Autosaver:
+    """ Saves a world to path every interval seconds, cheaply
+
+        The first save, and every one after compact_every deltas or once
+        the log outgrew the (uncompressed) checkpoint, is a full
+        checkpoint (compressed binary world) at path. The others append
+        just the changes to path + '.log', one JSON line each. See
+        load_autosave().
+    """
+
+    def __init__(self, saver, path, interval=3.0, compact_every=100,
+                 compression='zlib', level=6):
+        self.saver = saver
+        self.path = path
+        self.log_path = path + '.log'
+        self.interval = interval
+        self.compact_every = compact_every
+        self.compression = compression
+        self.level = level
+
+        self.seq = 0
+        self.deltas = 0
+        self.log_size = 0
+        self.checkpoint_size = 0
+        self.last = None
+        self.need_checkpoint = True
+
+    def reset(self):
+        """ Make the next save a checkpoint (after the world was
+            replaced, e.g. loaded)
+        """
+        self.need_checkpoint = True
+
+    def tick(self, world, get_vars):
+        """ Save if interval seconds passed since the last save
+
+            Parameters:
+              world ..... Elements
+              get_vars .. callable returning the additional_vars
+        """
+        now = time.monotonic()
+        if self.last is not None and now - self.last < self.interval:
+            return
+        self.last = now
+        self.save(world, get_vars())
+
+    def save(self, world, additional_vars):
+        self.seq += 1
+        if self.need_checkpoint or self.deltas >= self.compact_every or \
+                self.log_size > self.checkpoint_size:
+            self.checkpoint(world, additional_vars)
+            return
+
+        delta = world.take_delta(additional_vars)
+        if delta is None:
+            return
+        delta['seq'] = self.seq
+        self.deltas += 1
+
+        def run():
+            data = (json.dumps(delta, default=_encode) + '\n').encode('utf-8')
+            append(self.log_path, data)
+            self.log_size += len(data)
+
+        self.saver.submit(self.log_path, run)
+
+    def checkpoint(self, world, additional_vars):
+        """ Write a full save and start a new, empty log """
+        world.reset_changes()  # all in the checkpoint
+        snapshot = world.model_snapshot(additional_vars)
+        snapshot['additional_vars']['autosave_seq'] = self.seq
+
+        def write(f):
+            out = compression.writer(f, self.compression, self.level)
+            binary.dump(out, snapshot['bodylist'], snapshot['jointlist'],
+                        snapshot['additional_vars'])
+            out.close()
+            self.checkpoint_size = out.written
+
+        def clear(f):
+            self.log_size = 0
+
+        # the log is only emptied once the checkpoint is in place; a
+        # crash in between leaves deltas the checkpoint already has,
+        # which load_autosave skips by their seq
+        self.saver.save(self.path, write)
+        self.saver.save(self.log_path, clear)
+        self.deltas = 0
+        self.need_checkpoint = False
+
+    def remove(self):
+        """ Wait for the queued saves and delete the autosave files """
+        self.saver.close()
+        for path in (self.path, self.log_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def load_autosave(world, path, serialized=True):
+    """ Load the checkpoint at path into world and replay the deltas
+        logged after it
+
+        Return: number of deltas replayed
+    """
+    world.load(path, serialized)
+    seq = world.additional_vars.get('autosave_seq', 0)
+
+    replayed = 0
+    try:
+        f = open(path + '.log', 'rb')
+    except (IOError, OSError):
+        return replayed
+    with f:
+        for line in f:
+            try:
+                delta = json.loads(line.decode('utf-8'))
+            except ValueError:
+                break  # torn by a crash while appending
+            if delta['seq'] > seq:
+                world.apply_delta(delta)
+                replayed += 1
+    return replayed
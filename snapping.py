@@ -0,0 +1,153 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Girder endpoints in a uniform grid, so joint clicks can snap to them.
+
+GirderTool marks its bodies with userData['girder'], the vector (in
+meters, in body coordinates) from the body center to one end; the other
+end is the other way. The index keeps the world position of both ends
+of every such body, in square cells, and is kept up to date
+incrementally:
+
+  added(bodies) and removed(uids) right after the world changes,
+  and after physics steps the girders whose pose changed are moved.
+
+Anything else that changes the world (loading, restore) is noticed by
+its world revision and makes the next query rebuild the index.
+"""
+import math
+
+# cell size in meters, about a girder width; snap radii are usually
+# smaller, so a query reads 3x3 cells
+CELL = 0.5
+
+
+class EndpointIndex:
+
+    def __init__(self, world, cell=CELL):
+        self.world = world
+        self.cell = cell
+        self.clear()
+        self.key = None  # (revision, step_count) the index is valid for
+
+    def clear(self):
+        self.cells = {}   # (cx, cy) -> {(uid, end): (x, y)}
+        self.points = {}  # (uid, end) -> (cx, cy)
+        self.bodies = {}  # uid -> body
+        self.poses = {}   # uid -> (x, y, angle) the ends were placed at
+
+    def _cell(self, x, y):
+        return (int(math.floor(x / self.cell)),
+                int(math.floor(y / self.cell)))
+
+    def _insert(self, uid, body):
+        self.bodies[uid] = body
+        self.poses[uid] = (body.position.x, body.position.y, body.angle)
+        dx, dy = body.userData['girder']
+        for end, local in enumerate(((-dx, -dy), (dx, dy))):
+            x, y = body.GetWorldPoint(local)
+            cell = self._cell(x, y)
+            self.points[(uid, end)] = cell
+            self.cells.setdefault(cell, {})[(uid, end)] = (x, y)
+
+    def _delete(self, uid):
+        if self.bodies.pop(uid, None) is None:
+            return
+        del self.poses[uid]
+        for end in (0, 1):
+            cell = self.points.pop((uid, end))
+            points = self.cells[cell]
+            del points[(uid, end)]
+            if not points:
+                del self.cells[cell]
+
+    def _current(self):
+        return (self.world.revision, self.world.step_count)
+
+    def _changed(self):
+        # True if the index saw every change up to the one the caller
+        # just made, which bumped the world revision by one
+        revision, steps = self._current()
+        return self.key == (revision - 1, steps)
+
+    def added(self, bodies):
+        """ Index new girders, call after creating them """
+        if not self._changed():
+            return
+        for body in bodies:
+            self._insert(body.userData['uid'], body)
+        self.key = self._current()
+
+    def removed(self, uids):
+        """ Forget destroyed girders (by uid), call after destroying
+            them
+        """
+        if not self._changed():
+            return
+        for uid in uids:
+            self._delete(uid)
+        self.key = self._current()
+
+    def sync(self):
+        """ Bring the index up to date with the world """
+        current = self._current()
+        if current == self.key:
+            return
+        if self.key is not None and current[0] == self.key[0]:
+            # only physics steps: move the girders that moved, asleep
+            # by now or not
+            for uid, body in list(self.bodies.items()):
+                position = body.position
+                if self.poses[uid] != (position.x, position.y,
+                                       body.angle):
+                    self._delete(uid)
+                    self._insert(uid, body)
+        else:
+            self.clear()
+            for body in self.world.world.bodies:
+                if isinstance(body.userData, dict) and \
+                        'girder' in body.userData:
+                    self._insert(body.userData['uid'], body)
+        self.key = current
+
+    def nearest(self, pos, radius):
+        """ Girder ends near a point
+
+            Parameters:
+              pos ..... (x, y) in world meters
+              radius .. in meters
+
+            Return: list of (distance, (x, y), body), nearest first
+        """
+        self.sync()
+        x, y = pos
+        cx, cy = self._cell(x, y)
+        n = int(math.ceil(radius / self.cell))
+        found = []
+        for i in range(cx - n, cx + n + 1):
+            for j in range(cy - n, cy + n + 1):
+                points = self.cells.get((i, j))
+                if not points:
+                    continue
+                for (uid, end), (px, py) in points.items():
+                    d = math.hypot(px - x, py - y)
+                    if d <= radius:
+                        found.append((d, (px, py), self.bodies[uid]))
+        found.sort(key=lambda item: item[0])
+        return found
@@ -21,6 +21,11 @@ def distance2(pt1, pt2, amount):
         return True
     return ((pt1[0] - pt2[0]) ** 2 + (pt1[1] - pt2[1]) ** 2) <= (amount ** 2)
 
+
+def on_bank(pos):
+    # girder ends here (screen coordinates) can be pinned to the ground
+    return pos[1] > 550 and (pos[0] < 350 or pos[0] > 850)
+
 # tools that can be used superclass
 
 
@@ -53,6 +58,8 @@ class Tool(object):
                     self.game.bridge.create_train(force=True)
             elif event.key == pygame.K_b:
                 self.game.setTool("girder")
+            elif event.key == pygame.K_l:
+                self.game.setTool("girderchain")
             elif event.key == pygame.K_c:
                 self.game.setTool("circle")
             elif event.key == pygame.K_j:
@@ -61,6 +68,16 @@ class Tool(object):
                 self.game.setTool("grab")
             elif event.key == pygame.K_d:
                 self.game.setTool("destroy")
+            elif event.key == pygame.K_p:
+                # p shows where the time of a frame goes
+                self.game.profiler.toggle()
+            elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                # scrub through the paused run, a second at a time
+                if not self.game.world.run_physics:
+                    if event.key == pygame.K_LEFT:
+                        self.game.bridge.seek_by(-1.0)
+                    else:
+                        self.game.bridge.seek_by(1.0)
         elif event.type == pygame.USEREVENT:
             if hasattr(event, "action"):
                 if event.action in self.game.toolList:
@@ -103,7 +120,7 @@ class CircleTool(Tool):
         if not super(CircleTool, self).handleEvents(event, bridge):
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
-                    self.pt1 = pygame.mouse.get_pos()
+                    self.pt1 = self.game.mouse_pos()
             elif event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 1:
                     if self.radius > 1:  # elements doesn't like tiny shapes :(
@@ -117,7 +134,7 @@ class CircleTool(Tool):
     def draw(self):
         # draw a circle from pt1 to mouse
         if self.pt1 is not None:
-            mouse_pos = pygame.mouse.get_pos()
+            mouse_pos = self.game.mouse_pos()
             self.radius = helpers.distance(self.pt1, mouse_pos)
             if self.radius > 3:
                 thick = 3
@@ -160,7 +177,7 @@ class GirderTool(Tool):
         if not super(GirderTool, self).handleEvents(event, bridge):
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
-                    self.pt1 = pygame.mouse.get_pos()
+                    self.pt1 = self.game.mouse_pos()
             elif event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 1:
                     if self.pt2 is not None:
@@ -174,26 +191,31 @@ class GirderTool(Tool):
                         elif self.red < 20:
                             self.colordiff *= -1
                         print(self.theta, math.degrees(self.theta))
-                        self.game.world.add.rect(((self.pt1[0]
-                                                   + self.pt2[0]) / 2,
-                                                  (self.pt1[1]
-                                                   + self.pt2[1]) / 2),
-                                                 helpers.distance(
-                                                     self.pt1, self.pt2) / 2,
-                                                 self.thickness / 2,
-                                                 angle=math.degrees(
-                                                     self.theta),
-                                                 dynamic=True, density=1.0,
-                                                 restitution=0.16,
-                                                 friction=0.5)
+                        body = self.game.world.add.rect(
+                            ((self.pt1[0] + self.pt2[0]) / 2,
+                             (self.pt1[1] + self.pt2[1]) / 2),
+                            helpers.distance(self.pt1, self.pt2) / 2,
+                            self.thickness / 2,
+                            angle=math.degrees(self.theta),
+                            dynamic=True, density=1.0,
+                            restitution=0.16,
+                            friction=0.5)
+                        # where BridgeJointTool snaps to, the middle
+                        # of the square at each end
+                        offset = (helpers.distance(self.pt1, self.pt2)
+                                  - self.thickness) / 2 / self.game.world.ppm
+                        body.userData['girder'] = [
+                            offset * math.cos(self.theta),
+                            offset * math.sin(self.theta)]
                         self.game.bridge.box_added()
+                        self.game.bridge.endpoints.added([body])
                         self.game.world.reset_color()
                     self.pt1 = None
 
     def draw(self):
         # draw a box from pt1 to mouse
         if self.pt1 is not None:
-            self.pt2 = pygame.mouse.get_pos()
+            self.pt2 = self.game.mouse_pos()
             self.theta = helpers.getAngle(self.pt1, self.pt2)
             if distance2(self.pt1, self.pt2, self.min):
                 # too small! force length
@@ -210,6 +232,106 @@ class GirderTool(Tool):
         self.pt1 = None
         self.rect = None
 
+# The girder chain tool: one drag lays a line of girders, joined where
+# they meet
+
+
+class GirderChainTool(Tool):
+    name = "girderchain"
+    icon = "magicpen"
+    toolTip = _("Girder chain")
+
+    def __init__(self, gameInstance):
+        self.game = gameInstance
+        self.name = "Girder Chain"
+        self.vertices = None
+        self.thickness = 30
+        self.length = 200
+        self.min = 100
+        self.shade = 20
+
+    def handleEvents(self, event, bridge):
+        # look for default events, and if none are
+        # handled then try the custom events
+        if super(GirderChainTool, self).handleEvents(event, bridge):
+            return
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.vertices = [self.game.mouse_pos()]
+        elif self.vertices is None:
+            return
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            pos = self.game.mouse_pos()
+            self.extend(pos)
+            if not distance2(self.vertices[-1], pos, self.min):
+                self.vertices.append(pos)
+            if len(self.vertices) > 1:
+                self.build(self.vertices)
+            self.vertices = None
+        elif self.game.mouse_pressed()[0]:
+            self.extend(self.game.mouse_pos())
+
+    def extend(self, pos):
+        # a new vertex every self.length pixels along the drag
+        while not distance2(self.vertices[-1], pos, self.length):
+            last = self.vertices[-1]
+            theta = helpers.getAngle(last, pos)
+            self.vertices.append(
+                (last[0] + self.length * math.cos(theta),
+                 last[1] - self.length * math.sin(theta)))
+
+    def build(self, vertices):
+        # all girders and joints at once: one change of the world and
+        # one cost update
+        world = self.game.world
+        rects = []
+        for pt1, pt2 in zip(vertices, vertices[1:]):
+            # each girder reaches half its thickness past the vertices,
+            # so neighbours overlap in a square around their joint
+            rects.append((((pt1[0] + pt2[0]) / 2, (pt1[1] + pt2[1]) / 2),
+                          (helpers.distance(pt1, pt2) + self.thickness) / 2,
+                          self.thickness / 2,
+                          math.degrees(helpers.getAngle(pt1, pt2))))
+
+        # a grey for each chain, like GirderTool
+        world.set_color((self.shade, self.shade, self.shade))
+        bodies = world.add.rects(rects, dynamic=True, density=1.0,
+                                 restitution=0.16, friction=0.5)
+        world.reset_color()
+        self.shade = (self.shade + 40) % 200 + 20
+
+        for body, pt1, pt2 in zip(bodies, vertices, vertices[1:]):
+            offset = helpers.distance(pt1, pt2) / 2 / world.ppm
+            theta = helpers.getAngle(pt1, pt2)
+            body.userData['girder'] = [offset * math.cos(theta),
+                                       offset * math.sin(theta)]
+
+        joints = []
+        for i in range(1, len(bodies)):
+            jointDef = box2d.b2RevoluteJointDef()
+            jointDef.Initialize(bodies[i - 1], bodies[i],
+                                self.to_b2vec(vertices[i]))
+            joints.append(world.create_joint(jointDef))
+        for body, pos in ((bodies[0], vertices[0]),
+                          (bodies[-1], vertices[-1])):
+            if on_bank(pos):
+                jointDef = box2d.b2RevoluteJointDef()
+                jointDef.Initialize(world.world.groundBody, body,
+                                    self.to_b2vec(pos))
+                joints.append(world.create_joint(jointDef))
+
+        self.game.bridge.objects_added(len(bodies), joints)
+        self.game.bridge.endpoints.added(bodies)
+
+    def draw(self):
+        # draw the chain so far, and on to the mouse
+        if self.vertices:
+            pygame.draw.lines(self.game.screen, (255, 255, 255), False,
+                              self.vertices + [self.game.mouse_pos()],
+                              self.thickness)
+
+    def cancel(self):
+        self.vertices = None
+
 # The grab tool
 
 
@@ -261,24 +383,44 @@ class DestroyTool(Tool):
         # look for default events, and if none
         # are handled then try the custom events
         if not super(DestroyTool, self).handleEvents(event, bridge):
-            if pygame.mouse.get_pressed()[0]:
+            if self.game.mouse_pressed()[0]:
                 if not self.vertices:
                     self.vertices = []
-                self.vertices.append(pygame.mouse.get_pos())
+                pos = self.game.mouse_pos()
+                if self.vertices:
+                    # everything the trail swept over since the last
+                    # frame, not just what is under the mouse now
+                    tokill = self.game.world.hits.bodies_along(
+                        self.vertices[-1], pos)
+                else:
+                    self.vertices = []
+                    tokill = self.game.world.get_bodies_at_pos(pos)
+                self.vertices.append(pos)
                 if len(self.vertices) > 10:
                     self.vertices.pop(0)
-                tokill = self.game.world.get_bodies_at_pos(
-                    pygame.mouse.get_pos())
                 if tokill:
-                    joints = tokill[0].joints
-                    if len(joints) > 0:
-                        for joint in joints:
-                            self.game.bridge.joint_deleted(joint)
-                    self.game.world.world.DestroyBody(tokill[0])
-                    self.game.bridge.object_deleted()
+                    self.destroy(tokill)
             elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                 self.cancel()
 
+    def destroy(self, bodies):
+        # the joints of all the bodies, once each, even when both
+        # of their bodies are destroyed (joints hash and compare by
+        # the Box2D joint, not by the wrapper object)
+        joints = []
+        seen = set()
+        for body in bodies:
+            for edge in body.joints:
+                joint = edge.joint
+                if joint not in seen:
+                    seen.add(joint)
+                    joints.append(joint)
+        self.game.bridge.objects_deleted(len(bodies), joints)
+        uids = [body.userData['uid'] for body in bodies
+                if 'girder' in body.userData]
+        self.game.world.destroy_bodies(bodies)
+        self.game.bridge.endpoints.removed(uids)
+
     def draw(self):
         # draw the trail
         if self.vertices:
@@ -296,12 +438,38 @@ class BridgeJointTool(Tool):
     name = "bridgejoint"
     icon = "joint"
     toolTip = _("Bridge Joint")
+    # clicks this close (pixels) to a girder end join there
+    snap_radius = 20
 
     def __init__(self, gameInstance):
         self.game = gameInstance
         self.name = "Bridge Joint"
         self.jb1 = self.jb2 = self.jb1pos = self.jb2pos = None
 
+    def snap(self, pos):
+        # the nearest girder end to pos and the bodies to join there,
+        # or pos and the bodies under it if no end is close enough
+        world = self.game.world
+        x, y = world.to_world(pos)
+        radius = self.snap_radius / world.meter_to_screen(1)
+        ends = self.game.bridge.endpoints.nearest(
+            (x / world.ppm, y / world.ppm), radius)
+        if not ends:
+            return pos, world.get_bodies_at_pos(pos, include_static=True)
+
+        distance, (x, y), body = ends[0]
+        pos = world.to_screen((x * world.ppm, y * world.ppm))
+        bodies = world.get_bodies_at_pos(pos, include_static=True) or []
+        if body not in bodies:
+            bodies.append(body)
+        if len(bodies) == 1:
+            # girder ends that do not quite overlap
+            for distance, point, other in ends[1:]:
+                if other != body:
+                    bodies.append(other)
+                    break
+        return pos, bodies
+
     def handleEvents(self, event, bridge):
         # look for default events, and if none
         # are handled then try the custom events
@@ -310,18 +478,16 @@ class BridgeJointTool(Tool):
         if event.type != pygame.MOUSEBUTTONUP or event.button != 1:
             return
 
-        bodies = self.game.world.get_bodies_at_pos(event.pos,
-                                                   include_static=True)
+        pos, bodies = self.snap(event.pos)
         if not bodies or len(bodies) > 2:
             return
 
         jointDef = box2d.b2RevoluteJointDef()
         if len(bodies) == 1:
             if not bodies[0].type == box2d.b2_staticBody:
-                if event.pos[1] > 550 and (
-                        event.pos[0] < 350 or event.pos[0] > 850):
+                if on_bank(pos):
                     jointDef.Initialize(self.game.world.world.groundBody,
-                                        bodies[0], self.to_b2vec(event.pos))
+                                        bodies[0], self.to_b2vec(pos))
                 else:
                     return
             else:
@@ -329,14 +495,14 @@ class BridgeJointTool(Tool):
         elif len(bodies) == 2:
             if bodies[0].type == box2d.b2_staticBody:
                 jointDef.Initialize(self.game.world.world.groundBody,
-                                    bodies[1], self.to_b2vec(event.pos))
+                                    bodies[1], self.to_b2vec(pos))
             elif bodies[1].type == box2d.b2_staticBody:
                 jointDef.Initialize(self.game.world.world.groundBody,
-                                    bodies[0], self.to_b2vec(event.pos))
+                                    bodies[0], self.to_b2vec(pos))
             else:
                 jointDef.Initialize(
-                    bodies[0], bodies[1], self.to_b2vec(event.pos))
-        joint = self.game.world.world.CreateJoint(jointDef)
+                    bodies[0], bodies[1], self.to_b2vec(pos))
+        joint = self.game.world.create_joint(jointDef)
         self.game.bridge.joint_added(joint)
 
     def draw(self):
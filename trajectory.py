@@ -0,0 +1,74 @@
+# Bridge Activity
+
+# Copyright (C) Sugar Labs
+
+#  This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+
+import numpy
+
+
+class Trajectory:
+    """ The screen positions of a tracked body, packed as float32 x, y
+        pairs
+
+        A point is only stored once the body moved min_distance pixels
+        from the last stored point, and when there are more than
+        max_points points every other one is dropped, so the memory
+        used (and the size of saves) stays bounded.
+    """
+
+    def __init__(self, points=(), min_distance=2.0, max_points=4096):
+        self.points = array('f', points)
+        self.min_distance = min_distance
+        self.max_points = max_points
+
+    def __len__(self):
+        return len(self.points) // 2
+
+    def append(self, x, y):
+        """ Add a point, unless it is too close to the last one
+
+            Return: True if the point was stored
+        """
+        points = self.points
+        if len(points) >= 2:
+            dx = x - points[-2]
+            dy = y - points[-1]
+            if dx * dx + dy * dy < self.min_distance * self.min_distance:
+                return False
+
+        points.append(x)
+        points.append(y)
+        if len(points) > 2 * self.max_points:
+            self.decimate()
+        return True
+
+    def decimate(self):
+        """ Drop every other point, keeping the last one """
+        pairs = self.as_array()
+        keep = pairs[::-2][::-1]
+        self.points = array('f', keep.tobytes())
+
+    def as_array(self):
+        """ Return: (n, 2) float32 array of the points """
+        return numpy.frombuffer(self.points, numpy.float32).reshape(-1, 2)
+
+    @classmethod
+    def decode(cls, data, **kwargs):
+        """ Create a trajectory from saved points: an array('f') from a
+            binary save, or a list of x, y floats from a JSON save
+        """
+        return cls(data, **kwargs)